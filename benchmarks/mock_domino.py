@@ -0,0 +1,515 @@
+"""In-process stand-in for the parts of the Domino API used by dmm."""
+
+import asyncio
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+
+@dataclass
+class MockConfig:
+    projects: int = 100
+    apps_per_project: float = 0.5
+    models_per_project: int = 2
+    versions_per_model: int = 3
+    scheduled_jobs_per_project: int = 1
+    workspaces_per_project: int = 2
+    jobs_per_project: int = 5
+    # Image Builds across the deployment, running ones finish on their own
+    builds: int = 20
+    build_duration_s: float = 10.0
+    # Fraction of executions which are running at startup
+    running_fraction: float = 0.5
+    # Seconds, per endpoint template (e.g. "/v4/modelProducts/{id}") or "*"
+    latency_s: Dict[str, float] = field(default_factory=lambda: {"*": 0.0})
+    # Probability of a 500 response, per endpoint template or "*"
+    error_rate: Dict[str, float] = field(default_factory=lambda: {"*": 0.0})
+    # Seconds for an execution to reach its target state after a toggle
+    transition_s: float = 1.0
+    seed: int = 0
+
+
+class Lifecycle:
+    """A state which moves towards a target state after a delay."""
+
+    def __init__(self, state: str):
+        self.state = state
+        self.target: Optional[Tuple[str, float]] = None
+
+    def set(self, target: str, delay: float):
+        self.target = (target, time.monotonic() + delay)
+
+    def get(self) -> str:
+        if self.target is not None and time.monotonic() >= self.target[1]:
+            self.state = self.target[0]
+            self.target = None
+        return self.state
+
+    def is_pending(self) -> bool:
+        self.get()
+        return self.target is not None
+
+
+class MockDomino:
+    """Serves a generated deployment, see `MockConfig`.
+
+    Toggling an execution moves it to its new state after
+    `transition_s` seconds.
+    """
+
+    def __init__(self, config: MockConfig):
+        self.config = config
+        # Keyed by "<METHOD> <endpoint template>"
+        self.requests: Counter = Counter()
+        self.errors: Counter = Counter()
+        self.__random = random.Random(config.seed)
+        self.__build()
+
+    def __running(self) -> bool:
+        return self.__random.random() < self.config.running_fraction
+
+    def __build(self):
+        c = self.config
+        self.projects: List[dict] = []
+        self.apps: Dict[str, dict] = {}
+        self.app_states: Dict[str, Lifecycle] = {}
+        self.models: Dict[str, List[dict]] = {}
+        self.versions: Dict[str, List[dict]] = {}
+        self.version_states: Dict[str, Lifecycle] = {}
+        self.workspaces: Dict[str, dict] = {}
+        self.workspace_states: Dict[str, Lifecycle] = {}
+        self.scheduled_jobs: Dict[str, Dict[str, dict]] = {}
+        self.jobs: Dict[str, List[dict]] = {}
+        self.job_states: Dict[str, Lifecycle] = {}
+        self.builds: Dict[str, dict] = {}
+        self.build_states: Dict[str, Lifecycle] = {}
+        app_budget = 0.0
+        for p in range(c.projects):
+            pid = f"project{p}"
+            owner = f"user{p % 17}"
+            project = {
+                "id": pid,
+                "name": f"project-{p}",
+                "ownerUsername": owner,
+            }
+            self.projects.append(project)
+
+            app_budget += c.apps_per_project
+            while app_budget >= 1:
+                app_budget -= 1
+                aid = f"app{len(self.apps)}"
+                self.apps[aid] = {
+                    "id": aid,
+                    "name": f"app-{aid}",
+                    "projectId": pid,
+                    "hardwareTierId": "gpu" if len(self.apps) % 4 else "small",
+                    "publisher": {"userName": owner},
+                }
+                self.app_states[aid] = Lifecycle(
+                    "Running" if self.__running() else "Stopped"
+                )
+
+            self.models[pid] = []
+            for m in range(c.models_per_project):
+                mid = f"{pid}-model{m}"
+                versions = []
+                for v in range(c.versions_per_model):
+                    vid = f"{mid}-v{v}"
+                    versions.append(
+                        {
+                            "id": vid,
+                            "number": v + 1,
+                            "creator": {"name": owner},
+                        }
+                    )
+                    self.version_states[vid] = Lifecycle(
+                        "Running" if self.__running() else "Stopped"
+                    )
+                self.versions[mid] = versions
+                self.models[pid].append(
+                    {
+                        "id": mid,
+                        "name": f"model-{mid}",
+                        "activeModelVersionId": (
+                            versions[-1]["id"] if versions else None
+                        ),
+                    }
+                )
+
+            for w in range(c.workspaces_per_project):
+                wid = f"{pid}-ws{w}"
+                self.workspaces[wid] = {
+                    "workspaceId": wid,
+                    "name": f"ws-{w}",
+                    "projectName": project["name"],
+                    "projectOwnerName": owner,
+                    "ownerUsername": owner,
+                }
+                self.workspace_states[wid] = Lifecycle(
+                    "Started" if self.__running() else "Stopped"
+                )
+
+            self.scheduled_jobs[pid] = {}
+            for s in range(c.scheduled_jobs_per_project):
+                sid = f"{pid}-sched{s}"
+                self.scheduled_jobs[pid][sid] = {
+                    "id": sid,
+                    "projectId": pid,
+                    "title": f"sched-{s}",
+                    "scheduledByUserName": owner,
+                    "cronString": "0 * * * *",
+                    "isPaused": not self.__running(),
+                }
+
+            self.jobs[pid] = []
+            for j in range(c.jobs_per_project):
+                jid = f"{pid}-job{j}"
+                self.jobs[pid].append(
+                    {
+                        "id": jid,
+                        "projectId": pid,
+                        "number": j + 1,
+                        "startedBy": {"username": owner},
+                    }
+                )
+                self.job_states[jid] = Lifecycle(
+                    "Running" if self.__running() else "Succeeded"
+                )
+
+        now = time.time()
+        for b in range(c.builds):
+            bid = f"build{b}"
+            duration = self.__random.uniform(0.5, 1.5) * c.build_duration_s
+            elapsed = self.__random.uniform(0, 2) * duration
+            self.builds[bid] = {
+                "id": bid,
+                "environmentId": f"env{b % 7}",
+                "environmentName": f"env-{b % 7}",
+                "revisionNumber": b + 1,
+                "createdBy": {"username": f"user{b % 17}"},
+                "startedAt": (now - elapsed) * 1000,
+            }
+            if elapsed < duration and self.__running():
+                self.build_states[bid] = Lifecycle("Building")
+                self.build_states[bid].set("Succeeded", duration - elapsed)
+            else:
+                self.build_states[bid] = Lifecycle("Succeeded")
+                self.builds[bid]["finishedAt"] = (
+                    now - elapsed + duration
+                ) * 1000
+
+    def __setting(self, settings: Dict[str, float], endpoint: str) -> float:
+        return settings.get(endpoint, settings.get("*", 0.0))
+
+    def app(self) -> web.Application:
+        @web.middleware
+        async def simulate(request: web.Request, handler):
+            resource = request.match_info.route.resource
+            endpoint = request.path if resource is None else resource.canonical
+            route = f"{request.method} {endpoint}"
+            self.requests[route] += 1
+            delay = self.__setting(self.config.latency_s, endpoint)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if self.__random.random() < self.__setting(
+                self.config.error_rate, endpoint
+            ):
+                self.errors[route] += 1
+                return web.json_response({"error": "injected"}, status=500)
+            return await handler(request)
+
+        app = web.Application(middlewares=[simulate])
+        app.add_routes(
+            [
+                web.get("/v4/projects", self.get_projects),
+                web.get("/v4/modelProducts", self.get_apps),
+                web.get("/v4/modelProducts/{id}", self.get_app),
+                web.post("/v4/modelProducts/{id}/stop", self.stop_app),
+                web.post("/v4/modelProducts/{id}/start", self.start_app),
+                web.get(
+                    "/v4/datamount/projects/{projectId}", self.get_datamounts
+                ),
+                web.get("/v4/modelManager/getModels", self.get_models),
+                web.get("/models/{modelId}/versions/json", self.get_versions),
+                web.get(
+                    "/models/{modelId}/versions/{id}/json", self.get_version
+                ),
+                web.post(
+                    "/v4/models/{modelId}/{id}/stopModelDeployment",
+                    self.stop_version,
+                ),
+                web.post(
+                    "/v4/models/{modelId}/{id}/startModelDeployment",
+                    self.start_version,
+                ),
+                web.get(
+                    "/v4/workspace/adminDashboardRowData",
+                    self.get_workspace_rows,
+                ),
+                web.get(
+                    "/v4/workspace/project/{projectId}/workspace/{id}",
+                    self.get_workspace,
+                ),
+                web.post(
+                    "/v4/workspace/project/{projectId}/workspace/{id}/stop",
+                    self.stop_workspace,
+                ),
+                web.get(
+                    "/v4/projects/{projectId}/scheduledjobs",
+                    self.get_scheduled_jobs,
+                ),
+                web.get(
+                    "/v4/projects/{projectId}/scheduledjobs/{id}",
+                    self.get_scheduled_job,
+                ),
+                web.put(
+                    "/v4/projects/{projectId}/scheduledjobs/{id}",
+                    self.put_scheduled_job,
+                ),
+                web.get("/v4/jobs", self.get_jobs),
+                web.get("/v4/jobs/{id}", self.get_job),
+                web.post("/v4/jobs/stop", self.stop_job),
+                web.get("/v4/environments/builds", self.get_builds),
+                web.get("/v4/environments/builds/{id}", self.get_build),
+                web.post(
+                    "/v4/environments/builds/{id}/cancel", self.cancel_build
+                ),
+            ]
+        )
+        return app
+
+    # Projects
+
+    async def get_projects(self, request: web.Request) -> web.Response:
+        return web.json_response(self.projects)
+
+    # Apps
+
+    def __app(self, aid: str) -> dict:
+        return {**self.apps[aid], "status": self.app_states[aid].get()}
+
+    async def get_apps(self, request: web.Request) -> web.Response:
+        return web.json_response([self.__app(aid) for aid in self.apps])
+
+    async def get_app(self, request: web.Request) -> web.Response:
+        aid = request.match_info["id"]
+        if aid not in self.apps:
+            raise web.HTTPNotFound()
+        return web.json_response(self.__app(aid))
+
+    async def stop_app(self, request: web.Request) -> web.Response:
+        aid = request.match_info["id"]
+        self.app_states[aid].set("Stopped", self.config.transition_s)
+        return web.json_response(self.__app(aid))
+
+    async def start_app(self, request: web.Request) -> web.Response:
+        aid = request.match_info["id"]
+        body = await request.json()
+        if "hardwareTierId" not in body:
+            raise web.HTTPBadRequest()
+        self.app_states[aid].set("Running", self.config.transition_s)
+        return web.json_response(self.__app(aid))
+
+    async def get_datamounts(self, request: web.Request) -> web.Response:
+        pid = request.match_info["projectId"]
+        return web.json_response(
+            [
+                {"id": f"{pid}-edv", "dataPlanes": [{"isLocal": True}]},
+                {"id": f"{pid}-remote", "dataPlanes": [{"isLocal": False}]},
+            ]
+        )
+
+    # Model APIs
+
+    def __version(self, version: dict) -> dict:
+        state = self.version_states[version["id"]]
+        return {
+            **version,
+            "deploymentStatus": {
+                "name": state.get(),
+                "isPending": state.is_pending(),
+            },
+        }
+
+    async def get_models(self, request: web.Request) -> web.Response:
+        return web.json_response(
+            self.models.get(request.query["projectId"], [])
+        )
+
+    async def get_versions(self, request: web.Request) -> web.Response:
+        versions = self.versions[request.match_info["modelId"]]
+        page = int(request.query.get("pageNumber", 1))
+        size = int(request.query.get("pageSize", 10))
+        results = versions[(page - 1) * size : page * size]  # noqa: E203
+        return web.json_response(
+            {"results": [self.__version(v) for v in results]}
+        )
+
+    def __find_version(self, request: web.Request) -> dict:
+        for version in self.versions[request.match_info["modelId"]]:
+            if version["id"] == request.match_info["id"]:
+                return version
+        raise web.HTTPNotFound()
+
+    async def get_version(self, request: web.Request) -> web.Response:
+        version = self.__find_version(request)
+        return web.json_response({"result": self.__version(version)})
+
+    async def stop_version(self, request: web.Request) -> web.Response:
+        version = self.__find_version(request)
+        self.version_states[version["id"]].set(
+            "Stopped", self.config.transition_s
+        )
+        return web.json_response({})
+
+    async def start_version(self, request: web.Request) -> web.Response:
+        version = self.__find_version(request)
+        self.version_states[version["id"]].set(
+            "Running", self.config.transition_s
+        )
+        return web.json_response({})
+
+    # Workspaces
+
+    async def get_workspace_rows(self, request: web.Request) -> web.Response:
+        limit = int(request.query["limit"])
+        offset = int(request.query["offset"])
+        rows = list(self.workspaces.values())[offset : offset + limit]  # noqa
+        return web.json_response(
+            {
+                "tableRows": [
+                    {
+                        **row,
+                        "workspaceState": self.workspace_states[
+                            row["workspaceId"]
+                        ].get(),
+                    }
+                    for row in rows
+                ],
+                "totalEntries": len(self.workspaces),
+            }
+        )
+
+    async def get_workspace(self, request: web.Request) -> web.Response:
+        state = self.workspace_states[request.match_info["id"]].get()
+        return web.json_response(
+            {
+                "mostRecentSession": {
+                    "sessionStatusInfo": {
+                        "isCompleted": state == "Stopped",
+                        "isRunning": state == "Started",
+                    }
+                }
+            }
+        )
+
+    async def stop_workspace(self, request: web.Request) -> web.Response:
+        self.workspace_states[request.match_info["id"]].set(
+            "Stopped", self.config.transition_s
+        )
+        return web.json_response({})
+
+    # Scheduled Jobs
+
+    async def get_scheduled_jobs(self, request: web.Request) -> web.Response:
+        pid = request.match_info["projectId"]
+        return web.json_response(
+            list(self.scheduled_jobs.get(pid, {}).values())
+        )
+
+    async def get_scheduled_job(self, request: web.Request) -> web.Response:
+        pid = request.match_info["projectId"]
+        return web.json_response(
+            self.scheduled_jobs[pid][request.match_info["id"]]
+        )
+
+    async def put_scheduled_job(self, request: web.Request) -> web.Response:
+        pid = request.match_info["projectId"]
+        job = self.scheduled_jobs[pid][request.match_info["id"]]
+        job["isPaused"] = (await request.json())["isPaused"]
+        return web.json_response(job)
+
+    # Jobs
+
+    def __job(self, job: dict) -> dict:
+        state = self.job_states[job["id"]].get()
+        return {
+            **job,
+            "statuses": {
+                "executionStatus": state,
+                "isCompleted": state in ("Stopped", "Succeeded"),
+            },
+        }
+
+    def __find_job(self, jid: str) -> dict:
+        pid = jid.rsplit("-", 1)[0]
+        for job in self.jobs.get(pid, []):
+            if job["id"] == jid:
+                return job
+        raise web.HTTPNotFound()
+
+    async def get_jobs(self, request: web.Request) -> web.Response:
+        jobs = self.jobs.get(request.query["projectId"], [])[::-1]
+        page = int(request.query.get("page_no", 1))
+        size = int(request.query.get("page_size", 10))
+        results = jobs[(page - 1) * size : page * size]  # noqa: E203
+        return web.json_response(
+            {
+                "jobs": [self.__job(job) for job in results],
+                "totalCount": len(jobs),
+            }
+        )
+
+    async def get_job(self, request: web.Request) -> web.Response:
+        return web.json_response(
+            self.__job(self.__find_job(request.match_info["id"]))
+        )
+
+    async def stop_job(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        if "commitResults" not in body:
+            raise web.HTTPBadRequest()
+        job = self.__find_job(body["jobId"])
+        self.job_states[job["id"]].set("Stopped", self.config.transition_s)
+        return web.json_response({})
+
+    # Image Builds
+
+    def __build_status(self, bid: str) -> dict:
+        state = self.build_states[bid]
+        status = state.get()
+        build = self.builds[bid]
+        if status != "Building" and "finishedAt" not in build:
+            build["finishedAt"] = time.time() * 1000
+        return {**build, "status": status}
+
+    async def get_builds(self, request: web.Request) -> web.Response:
+        active = request.query["status"] == "active"
+        builds = [
+            build
+            for build in map(self.__build_status, reversed(self.builds))
+            if (build["status"] == "Building") == active
+        ]
+        offset = int(request.query["offset"])
+        limit = int(request.query["limit"])
+        return web.json_response(
+            {
+                "builds": builds[offset : offset + limit],  # noqa: E203
+                "totalCount": len(builds),
+            }
+        )
+
+    async def get_build(self, request: web.Request) -> web.Response:
+        bid = request.match_info["id"]
+        if bid not in self.builds:
+            raise web.HTTPNotFound()
+        return web.json_response(self.__build_status(bid))
+
+    async def cancel_build(self, request: web.Request) -> web.Response:
+        bid = request.match_info["id"]
+        self.build_states[bid].set("Stopped", self.config.transition_s)
+        return web.json_response({})
@@ -0,0 +1,307 @@
+"""Run dmm commands against a mock Domino API and report how they scale.
+
+Example:
+
+    python -m benchmarks.run --projects 1000 --latency-s 0.05 \\
+        --latency-s "/v4/modelProducts/{id}=0.2" --error-rate 0.01
+"""
+
+import asyncio
+import json
+import os
+import shlex
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterator, List, Tuple
+
+import click
+from aiohttp import web
+
+from benchmarks.mock_domino import MockConfig, MockDomino
+
+COMMANDS = ["snapshot", "shutdown", "restore", "stop-jobs", "stop-builds"]
+# Commands which take the snapshot path
+SNAPSHOT_COMMANDS = {"snapshot", "shutdown", "restore"}
+# Commands which work from an existing snapshot
+READS_SNAPSHOT = {"shutdown", "restore"}
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Answers to confirmation prompts, more than any command asks
+CONFIRMATIONS = b"y\n" * 100
+
+
+@dataclass
+class Result:
+    command: str
+    exit_code: int
+    wall_s: float
+    peak_rss_mb: float
+    requests: int
+    errors: int
+    requests_by_endpoint: Dict[str, int]
+
+
+@contextmanager
+def serve(mock: MockDomino) -> Iterator[str]:
+    """Serve `mock` on a free local port from a background thread.
+
+    Yields the base URL of the server.
+    """
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(mock.app(), access_log=None)
+
+    async def start() -> int:
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        return runner.addresses[0][1]
+
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    try:
+        port = asyncio.run_coroutine_threadsafe(start(), loop).result()
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+
+def run_command(
+    mock: MockDomino,
+    url: str,
+    cwd: str,
+    command: str,
+    args: List[str],
+    verbose: bool,
+) -> Result:
+    """Run one dmm command in a subprocess, so that its memory is isolated.
+
+    Any failure logs the command writes are left in `cwd`.
+    """
+    env = {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join(
+            filter(None, [ROOT, os.environ.get("PYTHONPATH")])
+        ),
+        "DOMINO_HOSTNAME": url,
+        "DOMINO_API_KEY": "benchmark",
+        "LOG_LEVEL": "INFO" if verbose else "WARNING",
+    }
+    output = None if verbose else subprocess.DEVNULL
+    requests_before = mock.requests.copy()
+    errors_before = sum(mock.errors.values())
+
+    tic = time.monotonic()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "domino_maintenance_mode.cli", command, *args],
+        env=env,
+        cwd=cwd,
+        stdin=subprocess.PIPE,
+        stdout=output,
+        stderr=output,
+    )
+    assert process.stdin is not None
+    process.stdin.write(CONFIRMATIONS)
+    process.stdin.close()
+    # Unlike 'Popen.wait', reports resource usage of this process alone
+    _, status, usage = os.wait4(process.pid, 0)
+    wall_s = time.monotonic() - tic
+    process.returncode = os.waitstatus_to_exitcode(status)
+
+    by_endpoint = dict(mock.requests - requests_before)
+    return Result(
+        command=command,
+        exit_code=process.returncode,
+        wall_s=wall_s,
+        # 'ru_maxrss' is in kilobytes on Linux
+        peak_rss_mb=usage.ru_maxrss / 1024,
+        requests=sum(by_endpoint.values()),
+        errors=sum(mock.errors.values()) - errors_before,
+        requests_by_endpoint=by_endpoint,
+    )
+
+
+def print_results(results: List[Result], verbose: bool):
+    click.echo(
+        f"{'command':<10} {'exit':>4} {'wall (s)':>9} {'peak RSS (MB)':>14}"
+        f" {'requests':>9} {'errors':>7}"
+    )
+    for result in results:
+        click.echo(
+            f"{result.command:<10} {result.exit_code:>4}"
+            f" {result.wall_s:>9.2f} {result.peak_rss_mb:>14.1f}"
+            f" {result.requests:>9} {result.errors:>7}"
+        )
+    if verbose:
+        for result in results:
+            click.echo(f"\n{result.command}:")
+            for endpoint, count in sorted(result.requests_by_endpoint.items()):
+                click.echo(f"  {count:>7}  {endpoint}")
+
+
+def parse_settings(values: Tuple[str, ...]) -> Dict[str, float]:
+    """Parse '[ENDPOINT=]VALUE' options, an endpoint defaults to '*'."""
+    settings = {"*": 0.0}
+    for value in values:
+        endpoint, _, setting = value.rpartition("=")
+        settings[endpoint or "*"] = float(setting)
+    return settings
+
+
+@click.command()
+@click.option("--projects", type=click.IntRange(min=0), default=100)
+@click.option("--apps-per-project", type=click.FloatRange(min=0), default=0.5)
+@click.option("--models-per-project", type=click.IntRange(min=0), default=2)
+@click.option("--versions-per-model", type=click.IntRange(min=0), default=3)
+@click.option(
+    "--scheduled-jobs-per-project", type=click.IntRange(min=0), default=1
+)
+@click.option(
+    "--workspaces-per-project", type=click.IntRange(min=0), default=2
+)
+@click.option("--jobs-per-project", type=click.IntRange(min=0), default=5)
+@click.option("--builds", type=click.IntRange(min=0), default=20)
+@click.option("--build-duration-s", type=click.FloatRange(min=0), default=10.0)
+@click.option("--running-fraction", type=click.FloatRange(0, 1), default=0.5)
+@click.option(
+    "--latency-s",
+    multiple=True,
+    help="'[ENDPOINT=]SECONDS', latency added to every response.",
+)
+@click.option(
+    "--error-rate",
+    multiple=True,
+    help="'[ENDPOINT=]PROBABILITY', chance of a 500 response.",
+)
+@click.option(
+    "--transition-s",
+    type=click.FloatRange(min=0),
+    default=1.0,
+    help="Seconds for an execution to stop or start once requested.",
+)
+@click.option("--seed", type=int, default=0)
+@click.option(
+    "-c",
+    "--command",
+    "commands",
+    type=click.Choice(COMMANDS),
+    multiple=True,
+    help="Command to benchmark, may be repeated. Defaults to all of them.",
+)
+@click.option(
+    "--output",
+    type=click.File("w"),
+    default=None,
+    help="(Optional) Write results as JSON, for comparison between runs.",
+)
+@click.option(
+    "--snapshot-args",
+    default="",
+    help="Extra arguments for 'dmm snapshot', e.g. '--concurrency 20'.",
+)
+@click.option(
+    "--shutdown-args",
+    default="",
+    help="Extra arguments for 'dmm shutdown', e.g. '-b 20 -g 60'.",
+)
+@click.option(
+    "--restore-args",
+    default="",
+    help="Extra arguments for 'dmm restore', e.g. '-b 20 -g 60'.",
+)
+@click.option(
+    "--stop-jobs-args",
+    default="",
+    help="Extra arguments for 'dmm stop-jobs', e.g. '--discard'.",
+)
+@click.option(
+    "--stop-builds-args",
+    default="",
+    help="Extra arguments for 'dmm stop-builds', e.g. '--drain'.",
+)
+@click.option(
+    "-v",
+    "--verbose",
+    is_flag=True,
+    default=False,
+    help="Show dmm output and requests per endpoint.",
+)
+def main(
+    latency_s: Tuple[str, ...],
+    error_rate: Tuple[str, ...],
+    commands: Tuple[str, ...],
+    output,
+    snapshot_args: str,
+    shutdown_args: str,
+    restore_args: str,
+    stop_jobs_args: str,
+    stop_builds_args: str,
+    verbose: bool,
+    **kwargs,
+):
+    """Benchmark dmm commands against a mock Domino API."""
+    args = {
+        "snapshot": shlex.split(snapshot_args),
+        "shutdown": shlex.split(shutdown_args),
+        "restore": shlex.split(restore_args),
+        "stop-jobs": shlex.split(stop_jobs_args),
+        "stop-builds": shlex.split(stop_builds_args),
+    }
+    config = MockConfig(
+        latency_s=parse_settings(latency_s),
+        error_rate=parse_settings(error_rate),
+        **kwargs,
+    )
+    mock = MockDomino(config)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp, serve(mock) as url:
+        snapshot = os.path.join(tmp, "snapshot.json")
+        for command in COMMANDS:
+            if commands and command not in commands:
+                continue
+            if command in READS_SNAPSHOT and not os.path.exists(snapshot):
+                # shutdown / restore need a snapshot to work from
+                run_command(
+                    mock,
+                    url,
+                    tmp,
+                    "snapshot",
+                    [snapshot, *args["snapshot"]],
+                    verbose,
+                )
+            results.append(
+                run_command(
+                    mock,
+                    url,
+                    tmp,
+                    command,
+                    [
+                        *([snapshot] if command in SNAPSHOT_COMMANDS else []),
+                        *args[command],
+                    ],
+                    verbose,
+                )
+            )
+
+    print_results(results, verbose)
+    if output is not None:
+        json.dump(
+            {
+                "config": asdict(config),
+                "results": list(map(asdict, results)),
+            },
+            output,
+            indent=2,
+        )
+    # Exit with the first failure, if any
+    sys.exit(next((r.exit_code for r in results if r.exit_code != 0), 0))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,36 @@
 # Entrypoint for Command Line
-import json
+import asyncio
+import datetime
+import glob
 import logging
 import os
+import re
 from asyncio import run as aiorun
-from dataclasses import asdict
-from typing import Any, Dict
+from collections import Counter
+from contextlib import aclosing
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
 
-import aiohttp
 import click
 
-from domino_maintenance_mode.execution_interface import ExecutionInterface
+from domino_maintenance_mode.execution_interface import (
+    Execution,
+    ExecutionInterface,
+    execution_key,
+)
+from domino_maintenance_mode.failure_log import FailureLog, read_failures
 from domino_maintenance_mode.interfaces.apps import Interface as AppInterface
+from domino_maintenance_mode.interfaces.builds import (
+    DEFAULT_BUILDS_PAGE_SIZE,
+)
+from domino_maintenance_mode.interfaces.builds import (
+    Interface as BuildInterface,
+)
+from domino_maintenance_mode.interfaces.jobs import DEFAULT_JOBS_PAGE_SIZE
+from domino_maintenance_mode.interfaces.jobs import Interface as JobInterface
 from domino_maintenance_mode.interfaces.model_apis import (
+    DEFAULT_MODELS_CONCURRENCY,
     DEFAULT_MODELS_PAGE_SIZE,
+    DEFAULT_PREFETCH_PAGES,
 )
 from domino_maintenance_mode.interfaces.model_apis import (
     Interface as ModelApiInterface,
@@ -26,8 +44,41 @@ from domino_maintenance_mode.interfaces.workspaces import (
 from domino_maintenance_mode.interfaces.workspaces import (
     Interface as WorkspaceInterface,
 )
+from domino_maintenance_mode.journal import (
+    CONFIRMED,
+    FAILED,
+    REQUESTED,
+    TIMEOUT,
+    Journal,
+    merge_journals,
+    read_journal,
+)
 from domino_maintenance_mode.manager import Manager
-from domino_maintenance_mode.projects import fetch_projects
+from domino_maintenance_mode.metrics import MetricsExporter, timed_phase
+from domino_maintenance_mode.profiling import profile
+from domino_maintenance_mode.progress import ProgressReporter
+from domino_maintenance_mode.project_scan import iter_projects
+from domino_maintenance_mode.projects import Project, fetch_projects
+from domino_maintenance_mode.rate_limit import (
+    DEFAULT_MAX_CONCURRENCY,
+    AdaptiveRateLimiter,
+)
+from domino_maintenance_mode.scope import Scope
+from domino_maintenance_mode.sharding import (
+    Shard,
+    ShardParamType,
+    in_shard,
+    shard_label,
+)
+from domino_maintenance_mode.snapshot import Snapshot, SnapshotWriter
+from domino_maintenance_mode.transport import (
+    DEFAULT_CONNECTION_LIMIT,
+    DEFAULT_DNS_CACHE_TTL_S,
+    DEFAULT_KEEPALIVE_TIMEOUT_S,
+    Transport,
+)
+
+logger = logging.getLogger(__name__)
 
 
 def __get_execution_interfaces(**kwargs) -> Dict[str, ExecutionInterface[Any]]:
@@ -45,21 +96,218 @@ def __get_execution_interfaces(**kwargs) -> Dict[str, ExecutionInterface[Any]]:
     }
 
 
-def __load_state(f) -> Dict[str, Any]:
-    state = {}
-    for k, v in json.load(f).items():
-        interface = __get_execution_interfaces()[k]
-        state[k] = list(map(interface.execution_from_dict, v))
-    return state
+# Default-configured interfaces, shared by every command which does not scan
+__execution_interfaces = __get_execution_interfaces()
+
+
+def __batches(
+    snapshot: Snapshot,
+    interfaces: List[ExecutionInterface],
+    shard: Optional[Shard],
+) -> Iterator[Tuple[ExecutionInterface, List[Execution]]]:
+    """Executions in `snapshot` by interface, read from disk one interface
+    at a time, limited to those in `shard`.
+    """
+    for interface in interfaces:
+        executions = [
+            execution
+            for execution in snapshot.executions(interface)
+            if in_shard(interface.shard_key(execution._id), shard)
+        ]
+        if len(executions) > 0:
+            yield interface, executions
+
+
+def __journal_path(snapshot: str, shard: Optional[Shard]) -> str:
+    if shard is None:
+        return f"{snapshot}.journal"
+    return f"{snapshot}.{shard_label(shard)}.journal"
+
+
+def __make_transport(
+    max_rps: Optional[float], max_concurrency: int, **kwargs
+) -> Transport:
+    return Transport(
+        AdaptiveRateLimiter(max_rps, max_concurrency=max(max_concurrency, 1)),
+        **kwargs,
+    )
+
+
+def transport_options(f):
+    """Options to tune the pooled HTTP client."""
+    for option in reversed(
+        [
+            click.option(
+                "--connection-limit",
+                type=click.IntRange(min=1),
+                default=DEFAULT_CONNECTION_LIMIT,
+                help="Maximum number of open connections to the Domino API.",
+            ),
+            click.option(
+                "--keepalive-timeout-s",
+                type=click.FloatRange(min=0),
+                default=DEFAULT_KEEPALIVE_TIMEOUT_S,
+                help="How long to keep idle connections open for reuse.",
+            ),
+            click.option(
+                "--dns-cache-ttl-s",
+                type=click.IntRange(min=0),
+                default=DEFAULT_DNS_CACHE_TTL_S,
+                help="How long to cache DNS lookups for.",
+            ),
+        ]
+    ):
+        f = option(f)
+    return f
+
+
+def manager_options(f):
+    """Options to tune how executions are stopped or started."""
+    for option in reversed(
+        [
+            click.option(
+                "-b",
+                "--batch-size",
+                type=click.IntRange(min=0),
+                default=5,
+                help=(
+                    "Number of concurrent requests to make when stopping or"
+                    " starting executions or polling for status."
+                ),
+            ),
+            click.option(
+                "--max-rps",
+                type=click.FloatRange(min=0, min_open=True),
+                default=None,
+                help=(
+                    "(Optional) Maximum number of API requests per second."
+                    " Requests are otherwise paced adaptively based on API"
+                    " latency and errors."
+                ),
+            ),
+            click.option(
+                "-m",
+                "--max-failures",
+                type=click.IntRange(min=0),
+                default=5,
+                help=(
+                    "Maximum number of failed API calls for a given "
+                    "execution before it is reported for manual cleanup."
+                ),
+            ),
+            click.option(
+                "-g",
+                "--grace-period-s",
+                type=click.IntRange(min=0),
+                default=600,
+                help=(
+                    "Amount of time to wait for executions to stop or start."
+                ),
+            ),
+        ]
+    ):
+        f = option(f)
+    return f
+
+
+def validate_new_path(ctx, param, value):
+    if os.path.exists(value):
+        raise click.BadParameter(f"'{value}' already exists.")
+    return value
+
+
+__project_scope_options = [
+    ("project", "Only scan projects with this id or name."),
+    ("exclude-project", "Skip projects with this id or name."),
+    ("owner", "Only scan projects owned by this user."),
+    ("exclude-owner", "Skip projects owned by this user."),
+]
+
+
+def __add_scope_options(f, options: List[Tuple[str, str]]):
+    for name, help in reversed(options):
+        f = click.option(
+            f"--{name}",
+            f"{name.replace('-', '_')}s",
+            multiple=True,
+            help=f"(Optional) {help} Accepts globs, may be repeated.",
+        )(f)
+    return f
+
+
+def project_scope_options(f):
+    """Options to limit a scan to some projects."""
+    return __add_scope_options(f, __project_scope_options)
+
+
+def scope_options(f):
+    """Options to limit a scan to part of the deployment."""
+    return __add_scope_options(
+        f,
+        __project_scope_options
+        + [
+            (
+                "hardware-tier",
+                "Only include Apps running on this hardware tier.",
+            ),
+            (
+                "exclude-hardware-tier",
+                "Skip Apps running on this hardware tier.",
+            ),
+        ],
+    )
 
 
 @click.group()
-def cli():
-    pass
+@click.option(
+    "--metrics-port",
+    type=click.IntRange(min=1, max=65535),
+    default=None,
+    help=(
+        "(Optional) Serve Prometheus metrics at "
+        "'http://127.0.0.1:<PORT>/metrics' while running."
+    ),
+)
+@click.option(
+    "--metrics-file",
+    type=click.Path(dir_okay=False, writable=True),
+    default=None,
+    help=(
+        "(Optional) Path to periodically write Prometheus metrics to, "
+        "for the node exporter textfile collector."
+    ),
+)
+@click.option(
+    "--profile",
+    "profile_prefix",
+    type=click.Path(dir_okay=False, writable=True),
+    default=None,
+    help=(
+        "(Optional) Profile the command, writing a cProfile dump to"
+        " '<PATH>.prof' and a timeline of concurrent tasks and API requests"
+        " to '<PATH>.trace.json' in the Chrome trace format."
+    ),
+)
+@click.pass_context
+def cli(
+    ctx,
+    metrics_port: Optional[int],
+    metrics_file: Optional[str],
+    profile_prefix: Optional[str],
+):
+    ctx.with_resource(MetricsExporter(metrics_port, metrics_file))
+    # Closed before the exporter, so its summary follows the progress line
+    ctx.with_resource(ProgressReporter())
+    if profile_prefix is not None:
+        ctx.with_resource(profile(profile_prefix))
 
 
 @click.command()
-@click.argument("output", type=click.File("x"))
+@click.argument(
+    "output",
+    type=click.Path(dir_okay=False, writable=True),
+    callback=validate_new_path,
+)
 @click.option(
     "--workspaces-page-size",
     default=DEFAULT_WORKSPACES_PAGE_SIZE,
@@ -72,108 +320,253 @@ def cli():
     default=DEFAULT_MODELS_PAGE_SIZE,
     help=("Number of models to fetch from the API per request."),
 )
+@click.option(
+    "--models-concurrency",
+    type=click.IntRange(min=1),
+    default=DEFAULT_MODELS_CONCURRENCY,
+    help=("Number of models to fetch versions for concurrently."),
+)
+@click.option(
+    "--prefetch-pages",
+    type=click.IntRange(min=0),
+    default=DEFAULT_PREFETCH_PAGES,
+    help=(
+        "Number of additional pages of model versions to request "
+        "speculatively once a full page has been returned."
+    ),
+)
 @click.option(
     "--concurrency",
     type=click.IntRange(min=1),
     default=10,
-    help=("Number of concurrent API per request per project id."),
+    help=(
+        "Number of concurrent API requests per project id, or per page "
+        "of Workspaces."
+    ),
+)
+@click.option(
+    "--max-requests",
+    type=click.IntRange(min=1),
+    default=DEFAULT_MAX_CONCURRENCY,
+    help=(
+        "Maximum number of concurrent API requests across all scans, "
+        "reduced automatically while the API is struggling."
+    ),
 )
+@click.option(
+    "--max-rps",
+    type=click.FloatRange(min=0, min_open=True),
+    default=None,
+    help="(Optional) Maximum number of API requests per second.",
+)
+@transport_options
+@scope_options
 def snapshot(output, **kwargs):
+    """Take a snapshot of running executions.
+
+    OUTPUT: Path to write snapshot file to. Must not exist.
+    """
     aiorun(_async_snapshot(output, **kwargs))
 
 
 cli.add_command(snapshot)
 
 
-async def _async_snapshot(output, **kwargs):
-    """Take a snapshot of running executions.
-
-    OUTPUT: Path to write snapshot file to. Must not exist.
-    """
-    projects = await fetch_projects()
-    state = {}
+async def _async_snapshot(
+    output,
+    max_requests: int,
+    max_rps: Optional[float],
+    connection_limit: int,
+    keepalive_timeout_s: float,
+    dns_cache_ttl_s: int,
+    projects: Tuple[str, ...],
+    exclude_projects: Tuple[str, ...],
+    owners: Tuple[str, ...],
+    exclude_owners: Tuple[str, ...],
+    hardware_tiers: Tuple[str, ...],
+    exclude_hardware_tiers: Tuple[str, ...],
+    **kwargs,
+):
+    interfaces = list(__get_execution_interfaces(**kwargs).values())
+    scope = Scope(
+        projects,
+        exclude_projects,
+        owners,
+        exclude_owners,
+        hardware_tiers,
+        exclude_hardware_tiers,
+    )
 
-    async with aiohttp.ClientSession() as session:
-        for interface in __get_execution_interfaces(**kwargs).values():
-            state[interface.singular()] = list(
-                map(asdict, await interface.list_running(session, projects))
+    with SnapshotWriter(output) as writer:
+        async with __make_transport(
+            max_rps,
+            max_requests,
+            connection_limit=connection_limit,
+            keepalive_timeout_s=keepalive_timeout_s,
+            dns_cache_ttl_s=dns_cache_ttl_s,
+        ) as transport:
+            with timed_phase("Project", "scan"):
+                all_projects = await fetch_projects(transport)
+                scoped_projects = scope.filter_projects(all_projects)
+            known_project_ids = {project._id for project in all_projects}
+            scoped_project_ids = {project._id for project in scoped_projects}
+
+            def write(
+                interface: ExecutionInterface, executions: List[Execution]
+            ):
+                # Written as each scan finishes, rather than once all have
+                writer.write(
+                    interface.singular(),
+                    scope.filter_executions(
+                        interface,
+                        executions,
+                        known_project_ids,
+                        scoped_project_ids,
+                    ),
+                )
+
+            async def scan(interface: ExecutionInterface):
+                with timed_phase(interface.singular(), "scan"):
+                    # Scans of the whole deployment are scoped afterwards
+                    executions = await interface.list_running(
+                        transport, all_projects
+                    )
+                write(interface, executions)
+
+            by_project = [i for i in interfaces if i.scans_by_project()]
+
+            async def scan_by_project():
+                with timed_phase("Project", "scan"):
+                    # Written per project, so only the projects being
+                    # scanned are held in memory
+                    async with aclosing(
+                        iter_projects(
+                            transport,
+                            scoped_projects,
+                            by_project,
+                            kwargs["concurrency"],
+                        )
+                    ) as results:
+                        async for interface, executions in results:
+                            write(interface, executions)
+
+            await asyncio.gather(
+                scan_by_project(),
+                *[
+                    scan(interface)
+                    for interface in interfaces
+                    if not interface.scans_by_project()
+                ],
             )
-
-    json.dump(state, output)
+    logger.info(f"Wrote snapshot of {dict(writer.counts)} to '{output}'.")
 
 
 def validate_services(ctx, param, value):
     if not value:
         return None
-    elif value not in __get_execution_interfaces().keys():
+    elif value not in __execution_interfaces.keys():
         raise click.BadParameter(
-            "Services must be one of "
-            f"{list(__get_execution_interfaces().keys())}"
+            "Services must be one of " f"{list(__execution_interfaces.keys())}"
         )
     else:
         return value
 
 
 @click.command()
-@click.argument("snapshot", type=click.File("r"))
-@click.option(
-    "-b",
-    "--batch-size",
-    type=click.IntRange(min=0),
-    default=5,
-    help=(
-        "Number of concurrent requests to make when "
-        "stopping executions or polling for status."
-    ),
+@click.argument(
+    "snapshot", type=click.Path(exists=True, dir_okay=False, readable=True)
 )
 @click.option(
     "-i",
     "--batch-interval_s",
     type=click.IntRange(min=0),
-    default=5,
-    help="Interval to wait between batches of API calls.",
+    default=None,
+    hidden=True,
+    help="Deprecated, use '--max-rps'.",
 )
 @click.option(
-    "-m",
-    "--max-failures",
-    type=click.IntRange(min=0),
-    default=5,
+    "--journal",
+    type=click.Path(dir_okay=False, writable=True),
+    default=None,
     help=(
-        "Maximum number of failed API calls for a given "
-        "execution before it is reported for manual cleanup."
+        "Path to the journal recording progress. Defaults to"
+        " '<SNAPSHOT>.journal', or '<SNAPSHOT>.shard-<i>-of-<N>.journal'."
     ),
 )
 @click.option(
-    "-g",
-    "--grace-period-s",
-    type=click.IntRange(min=0),
-    default=600,
-    help="Amount of time to wait for executions to complete.",
+    "--resume",
+    is_flag=True,
+    default=False,
+    help=(
+        "Resume an interrupted run, skipping executions which the "
+        "journal records as complete."
+    ),
+)
+@click.option(
+    "--pipelined",
+    is_flag=True,
+    default=False,
+    help=(
+        "Stop all services at once rather than one after another, after a"
+        " single confirmation. Services share one request budget and wait"
+        " out their grace periods together."
+    ),
 )
 @click.option(
     "-s",
     "--service",
     type=str,
     help="(Optional) Service to shutdown. Options are: "
-    f"{list(__get_execution_interfaces().keys())}",
+    f"{list(__execution_interfaces.keys())}",
     callback=validate_services,
 )
-def shutdown(snapshot, **kwargs):
+@click.option(
+    "--shard",
+    type=ShardParamType(),
+    default=None,
+    help=(
+        "(Optional) Only handle the i-th of N shards of the snapshot, e.g."
+        " '2/4', to split the work between several processes or hosts."
+        " Executions are assigned to shards by project."
+    ),
+)
+@manager_options
+@transport_options
+def shutdown(
+    snapshot,
+    connection_limit: int,
+    keepalive_timeout_s: float,
+    dns_cache_ttl_s: int,
+    journal: Optional[str],
+    resume: bool,
+    pipelined: bool,
+    **kwargs,
+):
     """Stop running Apps, Model APIs, Durable Workspaces, and Scheduled Jobs.
 
     SNAPSHOT : The path to snapshot output from 'dmm snapshot'.
     """
-    state = __load_state(snapshot)
-    manager = Manager(**kwargs)
-    if manager.get_service():
-        interface = __get_execution_interfaces()[manager.get_service()]
-        executions = state[interface.singular()]
-        if len(executions) > 0:
-            manager.stop(interface, executions)
-    else:
-        for interface in __get_execution_interfaces().values():
-            executions = state[interface.singular()]
-            if len(executions) > 0:
+    snapshot_reader = Snapshot(snapshot)
+    transport = __make_transport(
+        kwargs["max_rps"],
+        kwargs["batch_size"],
+        connection_limit=connection_limit,
+        keepalive_timeout_s=keepalive_timeout_s,
+        dns_cache_ttl_s=dns_cache_ttl_s,
+    )
+    with Journal(
+        journal or __journal_path(snapshot, kwargs["shard"]), resume
+    ) as j:
+        manager = Manager(transport=transport, journal=j, **kwargs)
+        if manager.get_service():
+            interfaces = [__execution_interfaces[manager.get_service()]]
+        else:
+            interfaces = list(__execution_interfaces.values())
+        batches = __batches(snapshot_reader, interfaces, kwargs["shard"])
+        if pipelined:
+            manager.stop_all(list(batches))
+        else:
+            for interface, executions in batches:
                 manager.stop(interface, executions)
 
 
@@ -181,77 +574,438 @@ cli.add_command(shutdown)
 
 
 @click.command()
-@click.argument("snapshot", type=click.File("r"))
+@click.argument(
+    "snapshot", type=click.Path(exists=True, dir_okay=False, readable=True)
+)
 @click.option(
-    "-b",
-    "--batch-size",
+    "-i",
+    "--batch-interval_s",
     type=click.IntRange(min=0),
-    default=5,
+    default=None,
+    hidden=True,
+    help="Deprecated, use '--max-rps'.",
+)
+@click.option(
+    "--journal",
+    type=click.Path(dir_okay=False, writable=True),
+    default=None,
     help=(
-        "Number of concurrent requests to make when "
-        "stopping executions or polling for status."
+        "Path to the journal recording progress. Defaults to"
+        " '<SNAPSHOT>.journal', or '<SNAPSHOT>.shard-<i>-of-<N>.journal'."
     ),
 )
 @click.option(
-    "-i",
-    "--batch-interval_s",
-    type=click.IntRange(min=0),
-    default=5,
-    help="Interval to wait between batches of API calls.",
+    "--resume",
+    is_flag=True,
+    default=False,
+    help=(
+        "Resume an interrupted run, skipping executions which the "
+        "journal records as complete."
+    ),
 )
 @click.option(
-    "-m",
-    "--max-failures",
-    type=click.IntRange(min=0),
-    default=5,
+    "--pipelined",
+    is_flag=True,
+    default=False,
     help=(
-        "Maximum number of failed API calls for a given "
-        "execution before it is reported for manual cleanup."
+        "Start all services at once rather than one after another, after a"
+        " single confirmation. Services share one request budget and wait"
+        " out their grace periods together."
     ),
 )
 @click.option(
-    "-g",
-    "--grace-period-s",
-    type=click.IntRange(min=0),
-    default=600,
-    help="Amount of time to wait for executions to complete.",
+    "--shard",
+    type=ShardParamType(),
+    default=None,
+    help=(
+        "(Optional) Only handle the i-th of N shards of the snapshot, e.g."
+        " '2/4', to split the work between several processes or hosts."
+        " Executions are assigned to shards by project."
+    ),
 )
-def restore(snapshot, **kwargs):
+@manager_options
+@transport_options
+def restore(
+    snapshot,
+    connection_limit: int,
+    keepalive_timeout_s: float,
+    dns_cache_ttl_s: int,
+    journal: Optional[str],
+    resume: bool,
+    pipelined: bool,
+    **kwargs,
+):
     """Restore previously running Apps, Model APIs, and Scheduled Jobs.
 
     SNAPSHOT : The path to snapshot output from 'dmm snapshot'.
     """
-    state = __load_state(snapshot)
-    manager = Manager(**kwargs)
-    for interface in __get_execution_interfaces().values():
-        if interface.is_restartable():
-            executions = state[interface.singular()]
-            if len(executions) > 0:
+    snapshot_reader = Snapshot(snapshot)
+    transport = __make_transport(
+        kwargs["max_rps"],
+        kwargs["batch_size"],
+        connection_limit=connection_limit,
+        keepalive_timeout_s=keepalive_timeout_s,
+        dns_cache_ttl_s=dns_cache_ttl_s,
+    )
+    with Journal(
+        journal or __journal_path(snapshot, kwargs["shard"]), resume
+    ) as j:
+        manager = Manager(transport=transport, journal=j, **kwargs)
+        batches = __batches(
+            snapshot_reader,
+            [
+                interface
+                for interface in __execution_interfaces.values()
+                if interface.is_restartable()
+            ],
+            kwargs["shard"],
+        )
+        if pipelined:
+            manager.start_all(list(batches))
+        else:
+            for interface, executions in batches:
                 manager.start(interface, executions)
 
 
 cli.add_command(restore)
 
 
-# @click.command()
-# @click.option(
-#     "--discard", default=False, help="Discard Job results when stopping."
-# )
-# def stop_jobs(discard: bool):
-#     """Stop running Jobs."""
-#     raise NotImplementedError("Stopping Jobs is not implemented.")
+@click.command()
+@click.argument(
+    "snapshot", type=click.Path(exists=True, dir_okay=False, readable=True)
+)
+@click.option(
+    "--output",
+    type=click.Path(dir_okay=False, writable=True),
+    default=None,
+    help=(
+        "Path to write the merged journal to. "
+        "Defaults to '<SNAPSHOT>.journal'."
+    ),
+)
+def merge(snapshot, output: Optional[str]):
+    """Combine the journals of a sharded shutdown or restore.
 
+    Summarises the outcome across all shards, and writes a single journal
+    which can be used to '--resume' without sharding.
 
-# cli.add_command(stop_jobs)
+    SNAPSHOT : The path to snapshot output from 'dmm snapshot'.
+    """
+    output = output or __journal_path(snapshot, None)
+    if os.path.exists(output):
+        raise click.BadParameter(f"'{output}' already exists.")
+    paths = sorted(glob.glob(f"{glob.escape(snapshot)}.shard-*-of-*.journal"))
+    if len(paths) == 0:
+        raise click.ClickException(
+            f"No shard journals found for '{snapshot}'."
+        )
+    shards: Dict[int, Set[int]] = {}
+    for path in paths:
+        match = re.search(r"\.shard-(\d+)-of-(\d+)\.journal$", path)
+        if match is not None:
+            shards.setdefault(int(match.group(2)), set()).add(
+                int(match.group(1))
+            )
+    for count, found in shards.items():
+        missing = sorted(set(range(1, count + 1)) - found)
+        if len(missing) > 0:
+            logger.warning(
+                f"Missing journals for shards {missing} of {count}."
+            )
 
+    events = merge_journals(paths, output)
+    logger.info(f"Merged {events} events from {len(paths)} journals.")
 
-# @click.command()
-# def stop_builds():
-#     """Stop running Image Builds."""
-#     raise NotImplementedError("Stopping Image Builds is not implemented.")
+    latest = read_journal(output)
+    # Keys of the executions in the snapshot, by type
+    snapshot_keys: Dict[str, List[str]] = {}
+    for singular, value in Snapshot(snapshot):
+        snapshot_keys.setdefault(singular, []).append(
+            execution_key(
+                __execution_interfaces[singular].execution_from_dict(value)
+            )
+        )
+    click.echo(
+        f"{'verb':<6} {'type':<20} {'confirmed':>9} {'requested':>9}"
+        f" {'failed':>6} {'timeout':>7} {'not run':>7}"
+    )
+    # Services which no shard reached are listed with everything not run
+    for verb in sorted({verb for verb, _ in latest}):
+        for singular, keys in sorted(snapshot_keys.items()):
+            interface = __execution_interfaces[singular]
+            if verb == "start" and not interface.is_restartable():
+                continue
+            by_key = latest.get((verb, singular), {})
+            counts = Counter(by_key.values())
+            not_run = [key for key in keys if key not in by_key]
+            click.echo(
+                f"{verb:<6} {singular:<20} {counts[CONFIRMED]:>9}"
+                f" {counts[REQUESTED]:>9} {counts[FAILED]:>6}"
+                f" {counts[TIMEOUT]:>7} {len(not_run):>7}"
+            )
+
+
+cli.add_command(merge)
+
+
+@click.command()
+@click.argument(
+    "failure_log",
+    type=click.Path(exists=True, dir_okay=False, readable=True),
+)
+@click.option(
+    "--discard",
+    is_flag=True,
+    default=False,
+    help="Discard the results of Jobs being stopped rather than syncing.",
+)
+@manager_options
+@transport_options
+def retry(
+    failure_log,
+    connection_limit: int,
+    keepalive_timeout_s: float,
+    dns_cache_ttl_s: int,
+    discard: bool,
+    **kwargs,
+):
+    """Stop or start the executions in a failure log again.
+
+    Executions which still fail are written to a new failure log.
+
+    FAILURE_LOG : The path to a '*-failed.ndjson' log written by a previous
+    command.
+    """
+    interfaces: Dict[str, ExecutionInterface[Any]] = dict(
+        __execution_interfaces
+    )
+    # Jobs and Image Builds are not in snapshots, but may have failed to stop
+    extra: List[ExecutionInterface[Any]] = [
+        JobInterface(discard=discard),
+        BuildInterface(),
+    ]
+    for interface in extra:
+        interfaces[interface.singular()] = interface
+    # The latest record of each execution, by verb and type
+    failed: Dict[str, Dict[str, Dict[str, Execution]]] = {}
+    for record in read_failures(failure_log):
+        if record["type"] not in interfaces:
+            raise click.ClickException(
+                f"Unknown execution type '{record['type']}' in"
+                f" '{failure_log}'."
+            )
+        execution = interfaces[record["type"]].execution_from_dict(
+            record["execution"]
+        )
+        failed.setdefault(record["verb"], {}).setdefault(record["type"], {})[
+            execution_key(execution)
+        ] = execution
+    if len(failed) == 0:
+        logger.info(f"No failed executions in '{failure_log}'.")
+        return
+
+    manager = Manager(
+        transport=__make_transport(
+            kwargs["max_rps"],
+            kwargs["batch_size"],
+            connection_limit=connection_limit,
+            keepalive_timeout_s=keepalive_timeout_s,
+            dns_cache_ttl_s=dns_cache_ttl_s,
+        ),
+        # One log for executions which fail to stop or to start
+        failure_log=FailureLog(
+            f"retry-{datetime.datetime.now().isoformat()}-failed.ndjson"
+        ),
+        **kwargs,
+    )
+    for verb, toggle_all in [
+        ("stop", manager.stop_all),
+        ("start", manager.start_all),
+    ]:
+        batches = [
+            (interfaces[singular], list(executions.values()))
+            for singular, executions in failed.get(verb, {}).items()
+        ]
+        if len(batches) > 0:
+            toggle_all(batches)
+
+
+cli.add_command(retry)
 
 
-# cli.add_command(stop_builds)
+@click.command()
+@click.option(
+    "--discard",
+    is_flag=True,
+    default=False,
+    help="Discard Job results when stopping, rather than syncing them.",
+)
+@click.option(
+    "--jobs-page-size",
+    type=click.IntRange(min=1),
+    default=DEFAULT_JOBS_PAGE_SIZE,
+    help="Number of Jobs to fetch from the API per request.",
+)
+@click.option(
+    "--concurrency",
+    type=click.IntRange(min=1),
+    default=10,
+    help="Number of projects to scan for running Jobs concurrently.",
+)
+@manager_options
+@transport_options
+@project_scope_options
+def stop_jobs(
+    discard: bool,
+    jobs_page_size: int,
+    concurrency: int,
+    connection_limit: int,
+    keepalive_timeout_s: float,
+    dns_cache_ttl_s: int,
+    projects: Tuple[str, ...],
+    exclude_projects: Tuple[str, ...],
+    owners: Tuple[str, ...],
+    exclude_owners: Tuple[str, ...],
+    **kwargs,
+):
+    """Stop running Jobs.
+
+    Depending on the fault-tolerance of the user code, data may be lost.
+    """
+    interface = JobInterface(
+        jobs_page_size=jobs_page_size,
+        concurrency=concurrency,
+        discard=discard,
+    )
+
+    def make_transport() -> Transport:
+        return __make_transport(
+            kwargs["max_rps"],
+            max(kwargs["batch_size"], concurrency),
+            connection_limit=connection_limit,
+            keepalive_timeout_s=keepalive_timeout_s,
+            dns_cache_ttl_s=dns_cache_ttl_s,
+        )
+
+    executions = aiorun(
+        _async_list_running(
+            make_transport(),
+            interface,
+            Scope(projects, exclude_projects, owners, exclude_owners),
+        )
+    )
+    if len(executions) == 0:
+        logger.info("No running Jobs found.")
+        return
+    Manager(transport=make_transport(), **kwargs).stop(interface, executions)
+
+
+cli.add_command(stop_jobs)
+
+
+async def _async_list_running(
+    transport: Transport,
+    interface: ExecutionInterface,
+    scope: Optional[Scope],
+) -> List[Execution]:
+    """List running executions of `interface`, in the projects in `scope`
+    or without scanning projects if there is none.
+    """
+    async with transport:
+        scoped_projects: List[Project] = []
+        if scope is not None:
+            with timed_phase("Project", "scan"):
+                scoped_projects = scope.filter_projects(
+                    await fetch_projects(transport)
+                )
+        with timed_phase(interface.singular(), "scan"):
+            return await interface.list_running(transport, scoped_projects)
+
+
+@click.command()
+@click.option(
+    "--drain",
+    is_flag=True,
+    default=False,
+    help=(
+        "Wait up to the grace period for Image Builds to finish on their"
+        " own rather than stopping them, logging an estimate of when the"
+        " last one will."
+    ),
+)
+@click.option(
+    "--builds-page-size",
+    type=click.IntRange(min=1),
+    default=DEFAULT_BUILDS_PAGE_SIZE,
+    help="Number of Image Builds to fetch from the API per request.",
+)
+@manager_options
+@transport_options
+def stop_builds(
+    drain: bool,
+    builds_page_size: int,
+    connection_limit: int,
+    keepalive_timeout_s: float,
+    dns_cache_ttl_s: int,
+    **kwargs,
+):
+    """Stop running Image Builds.
+
+    Stopped builds can be retried from the Environments UI once the
+    maintenance is complete.
+    """
+    interface = BuildInterface(
+        builds_page_size=builds_page_size, concurrency=kwargs["batch_size"]
+    )
+
+    def make_transport() -> Transport:
+        return __make_transport(
+            kwargs["max_rps"],
+            kwargs["batch_size"],
+            connection_limit=connection_limit,
+            keepalive_timeout_s=keepalive_timeout_s,
+            dns_cache_ttl_s=dns_cache_ttl_s,
+        )
+
+    executions = aiorun(_async_list_running(make_transport(), interface, None))
+    if len(executions) == 0:
+        logger.info("No running Image Builds found.")
+    elif drain:
+        aiorun(
+            _async_drain_builds(
+                make_transport(),
+                interface,
+                executions,
+                kwargs["grace_period_s"],
+            )
+        )
+    else:
+        Manager(transport=make_transport(), **kwargs).stop(
+            interface, executions
+        )
+
+
+cli.add_command(stop_builds)
+
+
+async def _async_drain_builds(
+    transport: Transport,
+    interface: BuildInterface,
+    executions: List[Execution],
+    grace_period_s: int,
+):
+    async with transport:
+        with timed_phase(interface.singular(), "wait"):
+            running = await interface.drain(
+                transport, executions, grace_period_s
+            )
+    if len(running) > 0:
+        logger.warning(
+            (
+                f"{len(running)} ImageBuilds are still running after"
+                f" {grace_period_s}s, run 'dmm stop-builds' to stop them."
+            )
+        )
 
 
 def main():
@@ -1,17 +1,10 @@
+import json
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
+from dataclasses import dataclass, fields, is_dataclass
 from typing import Generic, List, Optional, TypeVar
 
-import aiohttp
-import backoff
-import requests
-
 from domino_maintenance_mode.projects import Project
-from domino_maintenance_mode.util import (
-    get_api_key,
-    get_hostname,
-    should_verify,
-)
+from domino_maintenance_mode.transport import Transport
 
 Id = TypeVar("Id")
 
@@ -29,28 +22,28 @@ class FailedExecution(Generic[Id]):
     message: str
 
 
-class ExecutionInterface(ABC, Generic[Id]):
-    session: Optional[requests.Session] = None
-    async_session: Optional[aiohttp.ClientSession] = None
+@dataclass
+class ExecutionStatus:
+    stopped: bool
+    running: bool
+
+
+def _identity(_id) -> dict:
+    # Fields excluded from comparison hold state rather than identity
+    if is_dataclass(_id):
+        return {f.name: getattr(_id, f.name) for f in fields(_id) if f.compare}
+    return vars(_id)
+
+
+def execution_key(execution: Execution) -> str:
+    """A stable, hashable identifier for an execution."""
+    return json.dumps(execution._id, default=_identity, sort_keys=True)
+
 
+class ExecutionInterface(ABC, Generic[Id]):
     def __init__(self, **kwargs):
-        self.hostname = get_hostname()
-        self.api_key = get_api_key()
         pass
 
-    def __get_session(self) -> requests.Session:
-        if self.session is None:
-            # TODO: Ability to trust custom certs?
-            self.session = requests.Session()
-            self.session.headers.update(
-                {
-                    "Content-Type": "application/json",
-                    "X-Domino-Api-Key": self.api_key,
-                }
-            )
-            self.session.verify = should_verify()
-        return self.session
-
     def id_from_value(self, v) -> Id:
         # Override for non-primitive Id types
         return v
@@ -58,111 +51,105 @@ class ExecutionInterface(ABC, Generic[Id]):
     def execution_from_dict(self, d: dict) -> Execution[Id]:
         return Execution(self.id_from_value(d["_id"]), d["name"], d["owner"])
 
-    def get(self, path: str, success_code: int = 200) -> dict:
-        url = f"{self.hostname}{path}"
-
-        response = self.__get_session().get(url)
-        if response.status_code != success_code:
-            raise Exception(
-                f"API ({url})"
-                f"returned error ({response.status_code}): {response.text}"
-            )
-        return response.json()
-
-    @backoff.on_exception(
-        backoff.expo,
-        Exception,
-        max_tries=3,
-        jitter=backoff.random_jitter,
-        factor=0.5,
-    )
-    async def async_get(
-        self,
-        session: aiohttp.ClientSession,
-        path: str,
-        success_code: int = 200,
-    ) -> dict:
-        verify = should_verify()
-
-        try:
-            url = f"{self.hostname}{path}"
-
-            async with session.get(
-                url=url,
-                headers={
-                    "Content-Type": "application/json",
-                    "X-Domino-Api-Key": self.api_key,
-                },
-                verify_ssl=verify,
-            ) as response:
-                if response.status != success_code:
-                    resp = await response.text()
-                    raise Exception(
-                        f"API ({url})"
-                        f"returned error ({response.status}): {resp}"
-                    )
-                return await response.json()
-        except Exception as e:
-            print(f"Unable to get url {path} due to {e}.")
-            raise e
-
-    def post(
-        self, path: str, json: Optional[dict] = None, success_code: int = 200
-    ) -> dict:
-        url = f"{self.hostname}{path}"
-
-        response = self.__get_session().post(url, json=json)
-        if response.status_code != success_code:
-            raise Exception(
-                f"API ({url})"
-                f"returned error ({response.status_code}): {response.text}"
-            )
-        return response.json()
-
-    def put(
-        self, path: str, json: Optional[dict] = None, success_code: int = 200
-    ) -> dict:
-        url = f"{self.hostname}{path}"
-
-        response = self.__get_session().put(url, json=json)
-        if response.status_code != success_code:
-            raise Exception(
-                f"API ({url})"
-                f"returned error ({response.status_code}): {response.text}"
-            )
-        return response.json()
-
     @abstractmethod
     def singular(self) -> str:
         pass
 
     @abstractmethod
     async def list_running(
-        self, session: aiohttp.ClientSession, projects: List[Project]
+        self, transport: Transport, projects: List[Project]
     ) -> List[Execution[Id]]:
         """List non-stopped (running or pending) executions."""
         pass
 
+    def scans_by_project(self) -> bool:
+        """Does this interface implement `list_running_in_project`, so that
+        it can be scanned together with others in one pass over projects.
+        """
+        return False
+
+    async def list_running_in_project(
+        self, transport: Transport, project: Project
+    ) -> List[Execution[Id]]:
+        """List non-stopped executions in one project."""
+        raise NotImplementedError(
+            f"Scanning {self.singular()}s by project is not implemented."
+        )
+
+    async def prepare(
+        self,
+        transport: Transport,
+        verb: str,
+        ids: List[Id],
+        concurrency: int = 1,
+    ):
+        """Called once before `verb` ("stop" or "start") is applied to
+        `ids`, e.g. to warm caches. Failures are logged and ignored.
+        """
+        pass
+
     @abstractmethod
-    def stop(self, _id: Id):
-        """Initiate shutdown of an execution. Throws exception on failure."""
+    async def stop(self, transport: Transport, _id: Id) -> Optional[bool]:
+        """Initiate shutdown of an execution. Throws exception on failure.
+
+        Returns `True` if the response shows the execution already stopped,
+        so that its status need not be polled.
+        """
         pass
 
     @abstractmethod
-    def start(self, _id: Id):
-        """Initiate launch of an execution. Throws exception on failure."""
+    async def start(self, transport: Transport, _id: Id) -> Optional[bool]:
+        """Initiate launch of an execution. Throws exception on failure.
+
+        Returns `True` if the response shows the execution already running,
+        so that its status need not be polled.
+        """
         pass
 
     @abstractmethod
-    def is_running(self, _id: Id) -> bool:
+    async def is_running(self, transport: Transport, _id: Id) -> bool:
         """Is the execution in a stopped state."""
         pass
 
     @abstractmethod
-    def is_stopped(self, _id: Id) -> bool:
+    async def is_stopped(self, transport: Transport, _id: Id) -> bool:
         """Is the execution fully running."""
         pass
 
+    def shard_key(self, _id: Id) -> str:
+        """Executions with the same key are assigned to the same shard.
+
+        Defaults to the project, so that per-project lookups stay in one
+        shard.
+        """
+        project_id = getattr(_id, "projectId", None)
+        if project_id is not None:
+            return project_id
+        return json.dumps(_id, default=_identity, sort_keys=True)
+
+    def hardware_tier(self, _id: Id) -> Optional[str]:
+        """The hardware tier an execution runs on, if it is known."""
+        return None
+
+    def supports_status_many(self) -> bool:
+        """Does this interface implement `status_many`."""
+        return False
+
+    async def status_many(
+        self,
+        transport: Transport,
+        ids: List[Id],
+        concurrency: int = 1,
+    ) -> List[Optional[ExecutionStatus]]:
+        """Fetch the status of many executions using bulk API calls.
+
+        Returns a status for each id, in order, or `None` if the execution
+        was not found or its status could not be fetched.
+        """
+        raise NotImplementedError(
+            f"Bulk status is not implemented for {self.singular()}s."
+        )
+
     @abstractmethod
     def is_restartable(self) -> bool:
         """Should this execution type be restarted after
@@ -0,0 +1,111 @@
+import datetime
+import json
+import logging
+import os
+import re
+from dataclasses import asdict
+from typing import Iterator, Optional, TextIO
+
+from domino_maintenance_mode.execution_interface import Execution
+from domino_maintenance_mode.journal import FAILED, TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+# Logs written before the failure log was append-only were named
+# '<type>-<verb>-<time>-failed.json'
+__legacy_name = re.compile(r"^(?P<type>.+?)-(?P<verb>stop|start)-")
+
+
+class FailureLog:
+    """Append-only NDJSON log of executions which could not be stopped or
+    started, one record per execution, for 'dmm retry'.
+
+    The file is only created once the first failure is recorded.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.count = 0
+        self.__file: Optional[TextIO] = None
+
+    def __enter__(self) -> "FailureLog":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.__file is not None:
+            self.__file.close()
+            self.__file = None
+
+    def record(
+        self,
+        event: str,
+        verb: str,
+        singular: str,
+        execution: Execution,
+        error: Optional[str],
+        attempts: int,
+        state: Optional[str],
+    ):
+        """Record that `execution` `event` (failed or timed out), after
+        `attempts` calls to `verb` it, last observed in `state`.
+        """
+        if self.__file is None:
+            self.__file = open(self.path, "a")
+        self.__file.write(
+            json.dumps(
+                {
+                    "time": datetime.datetime.now().isoformat(),
+                    "event": event,
+                    "verb": verb,
+                    "type": singular,
+                    "execution": asdict(execution),
+                    "error": error,
+                    "attempts": attempts,
+                    "state": state,
+                }
+            )
+            + "\n"
+        )
+        self.__file.flush()
+        self.count += 1
+
+
+def read_failures(path: str) -> Iterator[dict]:
+    """Records in a failure log, including those written by older versions
+    as a single JSON document.
+    """
+    with open(path) as f:
+        content = f.read()
+    try:
+        document = json.loads(content)
+    except json.JSONDecodeError:
+        document = None
+    if isinstance(document, dict) and "modify" in document:
+        match = __legacy_name.match(os.path.basename(path))
+        if match is None:
+            raise Exception(
+                f"Unable to tell the type of executions in '{path}' from its"
+                " name, expected '<type>-<verb>-<time>-failed.json'."
+            )
+        for event, executions in [
+            (FAILED, document["modify"]),
+            (TIMEOUT, document.get("timeout") or []),
+        ]:
+            for execution in executions:
+                yield {
+                    "event": event,
+                    "verb": match.group("verb"),
+                    "type": match.group("type"),
+                    "execution": execution,
+                }
+        return
+
+    for line in content.splitlines():
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            # Partially written final line
+            continue
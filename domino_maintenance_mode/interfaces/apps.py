@@ -1,16 +1,19 @@
+import asyncio
 import logging
+import time
 from dataclasses import asdict, dataclass
 from pprint import pformat
-from typing import List
-
-import aiohttp
-from tqdm import tqdm  # type: ignore
+from typing import Dict, List, Optional, Tuple
 
+from domino_maintenance_mode import progress
 from domino_maintenance_mode.execution_interface import (
     Execution,
     ExecutionInterface,
+    ExecutionStatus,
 )
 from domino_maintenance_mode.projects import Project
+from domino_maintenance_mode.transport import Transport
+from domino_maintenance_mode.util import gather_with_concurrency
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +21,9 @@ logger = logging.getLogger(__name__)
 STOPPED_STATES = {"Stopped", "Succeeded", "Failed", "Error"}
 RUNNING_STATES = {"Running", "Serving"}
 
+# How long the EDVs mounted in a project are reused when starting its Apps
+DEFAULT_DATAMOUNT_TTL_S = 300
+
 
 @dataclass
 class StartRequest:
@@ -33,8 +39,13 @@ class AppId:
 
 
 class Interface(ExecutionInterface[AppId]):
-    def __init__(self, **kwargs):
+    def __init__(self, datamount_ttl_s=DEFAULT_DATAMOUNT_TTL_S, **kwargs):
         super().__init__()
+        self.datamount_ttl_s = datamount_ttl_s
+        # Local EDV ids and when they expire, by project id
+        self.__edv_ids: Dict[str, Tuple[float, List[str]]] = {}
+        # Lookups in flight, so that concurrent starts share one request
+        self.__edv_lookups: Dict[str, asyncio.Future] = {}
 
     def id_from_value(self, v) -> AppId:
         return AppId(**v)
@@ -43,12 +54,14 @@ class Interface(ExecutionInterface[AppId]):
         return "App"
 
     async def list_running(
-        self, session: aiohttp.ClientSession, projects: List[Project]
+        self, transport: Transport, projects: List[Project]
     ) -> List[Execution[AppId]]:
         logger.info("Scanning Apps")
-        data = self.get("/v4/modelProducts")
+        data = await transport.get("/v4/modelProducts")
+        scanned = progress.counter(self.singular(), "scan", total=len(data))
         executions = []
-        for app in tqdm(data, desc="Apps"):
+        for app in data:
+            scanned.update()
             logger.debug(pformat(app))
             try:
                 if app["status"] in STOPPED_STATES:
@@ -66,26 +79,83 @@ class Interface(ExecutionInterface[AppId]):
                 logger.error(f"Error parsing App: {app.get('id')}: {e}")
         return executions
 
-    def stop(self, _id: AppId):
-        self.post(f"/v4/modelProducts/{_id._id}/stop")
-
-    def start(self, _id: AppId):
-        # List EDVs
-        edvIds = list(
-            map(
-                lambda edv: edv["id"],
-                filter(
-                    lambda edv: any(
-                        map(
-                            lambda dataPlane: dataPlane["isLocal"],
-                            edv["dataPlanes"],
-                        )
+    def hardware_tier(self, _id: AppId) -> Optional[str]:
+        return _id.hardwareTierId
+
+    async def stop(self, transport: Transport, _id: AppId):
+        await transport.post(f"/v4/modelProducts/{_id._id}/stop")
+
+    async def prepare(
+        self,
+        transport: Transport,
+        verb: str,
+        ids: List[AppId],
+        concurrency: int = 1,
+    ):
+        if verb != "start":
+            return
+        project_ids = sorted({_id.projectId for _id in ids})
+        logger.info(f"Listing EDVs for {len(project_ids)} projects")
+
+        async def warm(project_id: str):
+            try:
+                await self.__local_edv_ids(transport, project_id)
+            except Exception as e:
+                # Retried when the App is started
+                logger.warn(f"Unable to list EDVs of '{project_id}': {e}")
+
+        await gather_with_concurrency(concurrency, *map(warm, project_ids))
+
+    async def __local_edv_ids(
+        self, transport: Transport, project_id: str
+    ) -> List[str]:
+        cached = self.__edv_ids.get(project_id)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+        if project_id in self.__edv_lookups:
+            return await asyncio.shield(self.__edv_lookups[project_id])
+
+        lookup = asyncio.get_running_loop().create_future()
+        self.__edv_lookups[project_id] = lookup
+        try:
+            mounts = await transport.get(
+                f"/v4/datamount/projects/{project_id}"
+            )
+            edvIds = list(
+                map(
+                    lambda edv: edv["id"],
+                    filter(
+                        lambda edv: any(
+                            map(
+                                lambda dataPlane: dataPlane["isLocal"],
+                                edv["dataPlanes"],
+                            )
+                        ),
+                        mounts,
                     ),
-                    self.get(f"/v4/datamount/projects/{_id.projectId}"),
-                ),
+                )
             )
-        )
-        self.post(
+        except asyncio.CancelledError:
+            lookup.cancel()
+            raise
+        except Exception as e:
+            lookup.set_exception(e)
+            # Retrieve it here, waiting callers (if any) see it when awaiting
+            lookup.exception()
+            raise
+        else:
+            self.__edv_ids[project_id] = (
+                time.monotonic() + self.datamount_ttl_s,
+                edvIds,
+            )
+            lookup.set_result(edvIds)
+            return edvIds
+        finally:
+            del self.__edv_lookups[project_id]
+
+    async def start(self, transport: Transport, _id: AppId):
+        edvIds = await self.__local_edv_ids(transport, _id.projectId)
+        await transport.post(
             f"/v4/modelProducts/{_id._id}/start",
             json=asdict(
                 StartRequest(
@@ -95,13 +165,38 @@ class Interface(ExecutionInterface[AppId]):
             ),
         )
 
-    def is_stopped(self, _id: AppId) -> bool:
-        data = self.get(f"/v4/modelProducts/{_id._id}")
+    async def is_stopped(self, transport: Transport, _id: AppId) -> bool:
+        data = await transport.get(f"/v4/modelProducts/{_id._id}")
         return data["status"] in STOPPED_STATES
 
-    def is_running(self, _id: AppId) -> bool:
-        data = self.get(f"/v4/modelProducts/{_id._id}")
+    async def is_running(self, transport: Transport, _id: AppId) -> bool:
+        data = await transport.get(f"/v4/modelProducts/{_id._id}")
         return data["status"] in RUNNING_STATES
 
+    def supports_status_many(self) -> bool:
+        return True
+
+    async def status_many(
+        self,
+        transport: Transport,
+        ids: List[AppId],
+        concurrency: int = 1,
+    ) -> List[Optional[ExecutionStatus]]:
+        statuses = {
+            app["id"]: app["status"]
+            for app in await transport.get("/v4/modelProducts")
+        }
+        return [
+            (
+                ExecutionStatus(
+                    statuses[_id._id] in STOPPED_STATES,
+                    statuses[_id._id] in RUNNING_STATES,
+                )
+                if _id._id in statuses
+                else None
+            )
+            for _id in ids
+        ]
+
     def is_restartable(self) -> bool:
         return True
@@ -1,44 +1,252 @@
-from typing import List
-
-import aiohttp
+import asyncio
+import datetime
+import logging
+import statistics
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
 
+from domino_maintenance_mode import progress
 from domino_maintenance_mode.execution_interface import (
     Execution,
     ExecutionInterface,
+    ExecutionStatus,
 )
 from domino_maintenance_mode.projects import Project
+from domino_maintenance_mode.transport import Transport
+from domino_maintenance_mode.util import gather_with_concurrency
+
+# From BuildStatus.scala
+RUNNING_OR_PENDING_STATES = {"Queued", "Preparing", "Building", "Pushing"}
+STOPPED_STATES = {"Succeeded", "Failed", "Stopped", "Cancelled"}
+BASE_PATH: str = "/v4/environments/builds"
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUILDS_PAGE_SIZE = 50
+# How often builds are polled, and the ETA logged, while draining. Polls
+# are brought forward to when the builds are expected to finish.
+DRAIN_POLL_INTERVAL_S = 15.0
+MIN_DRAIN_POLL_INTERVAL_S = 1.0
+
+
+@dataclass
+class BuildId:
+    _id: str
+    environmentId: str
+    # Seconds since the epoch, used to estimate when the build will finish
+    startedAt: Optional[float] = field(default=None, compare=False)
 
 
-class Interface(ExecutionInterface[str]):
-    def __init__(self, **kwargs):
+def estimate_remaining_s(
+    durations: List[float], elapsed: List[float]
+) -> Optional[float]:
+    """Estimate how long until every build has finished.
+
+    Each build is expected to take the median duration of past builds which
+    ran for longer than it has so far. `None` if there is no such past build
+    for some build.
+    """
+    eta = 0.0
+    for e in elapsed:
+        longer = [d for d in durations if d > e]
+        if len(longer) == 0:
+            return None
+        eta = max(eta, statistics.median(longer) - e)
+    return eta
+
+
+class Interface(ExecutionInterface[BuildId]):
+    page_size: int
+    concurrency: int
+
+    def __init__(
+        self,
+        builds_page_size=DEFAULT_BUILDS_PAGE_SIZE,
+        concurrency=1,
+        **kwargs,
+    ):
         super().__init__()
+        self.page_size = builds_page_size
+        self.concurrency = concurrency
+
+    def id_from_value(self, v) -> BuildId:
+        return BuildId(**v)
 
     def singular(self) -> str:
         return "ImageBuild"
 
+    async def __page(
+        self, transport: Transport, status: str, offset: int
+    ) -> dict:
+        return await transport.get(
+            f"{BASE_PATH}?status={status}&offset={offset}"
+            f"&limit={self.page_size}"
+        )
+
+    async def list_active(self, transport: Transport) -> List[dict]:
+        """All queued and running builds across the deployment.
+
+        The first page tells us how many pages remain, which are then
+        fetched concurrently.
+        """
+        first = await self.__page(transport, "active", 0)
+        pages = await gather_with_concurrency(
+            self.concurrency,
+            *[
+                self.__page(transport, "active", offset)
+                for offset in range(
+                    self.page_size, first["totalCount"], self.page_size
+                )
+            ],
+        )
+        builds: Dict[str, dict] = {}
+        for page in [first, *pages]:
+            for build in page["builds"]:
+                builds[build["id"]] = build
+        return list(builds.values())
+
+    async def recent_durations(self, transport: Transport) -> List[float]:
+        """Durations in seconds of the most recently completed builds."""
+        page = await self.__page(transport, "completed", 0)
+        return [
+            (build["finishedAt"] - build["startedAt"]) / 1000
+            for build in page["builds"]
+            if build.get("startedAt") is not None
+            and build.get("finishedAt") is not None
+            and build["status"] == "Succeeded"
+        ]
+
     async def list_running(
-        self, session: aiohttp.ClientSession, projects: List[Project]
-    ) -> List[Execution[str]]:
-        # TODO
-        return []
+        self, transport: Transport, projects: List[Project]
+    ) -> List[Execution[BuildId]]:
+        logger.info("Scanning Image Builds")
+        builds = await self.list_active(transport)
+        scanned = progress.counter(self.singular(), "scan", total=len(builds))
+        executions = []
+        for build in builds:
+            scanned.update()
+            try:
+                if build["status"] not in RUNNING_OR_PENDING_STATES:
+                    continue
+                executions.append(
+                    Execution(
+                        BuildId(
+                            build["id"],
+                            build["environmentId"],
+                            (
+                                build["startedAt"] / 1000
+                                if build.get("startedAt") is not None
+                                else None
+                            ),
+                        ),
+                        f"{build['environmentName']}"
+                        f" revision {build['revisionNumber']}",
+                        build["createdBy"]["username"],
+                    )
+                )
+            except Exception as e:
+                logger.error(f"Error parsing Build: {build.get('id')}: {e}")
+        return executions
 
-    def stop(self, _id: str):
-        # TODO
-        return
+    async def stop(self, transport: Transport, _id: BuildId):
+        await transport.post(f"{BASE_PATH}/{_id._id}/cancel")
 
-    def start(self, _id: str):
-        # TODO
+    async def start(self, transport: Transport, _id: BuildId):
         raise NotImplementedError(
             "Relaunching ImageBuilds is not implemented."
         )
 
-    def is_stopped(self, _id: str) -> bool:
-        # TODO
-        return True
+    async def is_stopped(self, transport: Transport, _id: BuildId) -> bool:
+        build = await transport.get(f"{BASE_PATH}/{_id._id}")
+        return build["status"] in STOPPED_STATES
 
-    def is_running(self, _id: str) -> bool:
-        # TODO
+    async def is_running(self, transport: Transport, _id: BuildId) -> bool:
+        build = await transport.get(f"{BASE_PATH}/{_id._id}")
+        return build["status"] in RUNNING_OR_PENDING_STATES
+
+    def supports_status_many(self) -> bool:
         return True
 
+    async def status_many(
+        self,
+        transport: Transport,
+        ids: List[BuildId],
+        concurrency: int = 1,
+    ) -> List[Optional[ExecutionStatus]]:
+        # Builds no longer listed as active have finished
+        statuses = {
+            build["id"]: build["status"]
+            for build in await self.list_active(transport)
+        }
+        return [
+            ExecutionStatus(
+                statuses.get(_id._id, "Stopped") in STOPPED_STATES,
+                statuses.get(_id._id) in RUNNING_OR_PENDING_STATES,
+            )
+            for _id in ids
+        ]
+
+    async def drain(
+        self,
+        transport: Transport,
+        executions: List[Execution[BuildId]],
+        timeout_s: float,
+        poll_interval_s: float = DRAIN_POLL_INTERVAL_S,
+    ) -> List[Execution[BuildId]]:
+        """Wait up to `timeout_s` for builds to finish on their own, logging
+        an estimate of when the last one will.
+
+        Returns the builds which are still running.
+        """
+        try:
+            durations = await self.recent_durations(transport)
+        except Exception as e:
+            logger.warning(f"Unable to list completed builds: {e}")
+            durations = []
+
+        deadline = time.monotonic() + timeout_s
+        while True:
+            try:
+                statuses = await self.status_many(
+                    transport, [execution._id for execution in executions]
+                )
+            except Exception as e:
+                logger.warning(f"Error polling ImageBuild state: {e}")
+                statuses = [None] * len(executions)
+            now = time.time()
+            running = []
+            for execution, status in zip(executions, statuses):
+                if status is None or not status.stopped:
+                    running.append(execution)
+                    continue
+                logger.info(f"ImageBuild '{execution.name}' finished.")
+                if execution._id.startedAt is not None:
+                    durations.append(now - execution._id.startedAt)
+            executions = running
+
+            remaining_s = deadline - time.monotonic()
+            if len(executions) == 0 or remaining_s <= 0:
+                return executions
+            eta = estimate_remaining_s(
+                durations,
+                [
+                    now - (execution._id.startedAt or now)
+                    for execution in executions
+                ],
+            )
+            logger.info(
+                f"Waiting for {len(executions)} ImageBuilds to finish, "
+                + (
+                    f"ETA {datetime.timedelta(seconds=round(eta))}."
+                    if eta is not None
+                    else "ETA unknown."
+                )
+            )
+            delay = poll_interval_s
+            if eta is not None:
+                delay = max(min(delay, eta), MIN_DRAIN_POLL_INTERVAL_S)
+            await asyncio.sleep(min(delay, remaining_s))
+
     def is_restartable(self) -> bool:
         return False
@@ -1,49 +1,229 @@
-from typing import List
-
-import aiohttp
+import asyncio
+import logging
+import math
+from collections import deque
+from contextlib import aclosing
+from dataclasses import dataclass
+from typing import AsyncGenerator, Deque, Dict, List, Optional
 
 from domino_maintenance_mode.execution_interface import (
     Execution,
     ExecutionInterface,
+    ExecutionStatus,
 )
+from domino_maintenance_mode.project_scan import scan_projects
 from domino_maintenance_mode.projects import Project
+from domino_maintenance_mode.transport import Transport
+from domino_maintenance_mode.util import gather_with_concurrency
+
+# From ExecutionStatus.scala
+RUNNING_STATES = {"Running", "Serving"}
+STOPPED_STATES = {"Stopped", "Succeeded", "Failed", "Error"}
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_JOBS_PAGE_SIZE = 50
+DEFAULT_JOBS_PREFETCH_PAGES = 2
+
+
+def _is_stopped(statuses: dict) -> bool:
+    return (
+        statuses["isCompleted"]
+        or statuses["executionStatus"] in STOPPED_STATES
+    )
+
 
+@dataclass
+class JobId:
+    _id: str
+    projectId: str
 
-class Interface(ExecutionInterface[str]):
-    def __init__(self, **kwargs):
+
+class Interface(ExecutionInterface[JobId]):
+    page_size: int
+    concurrency: int
+    prefetch_pages: int
+    discard: bool
+
+    def __init__(
+        self,
+        jobs_page_size=DEFAULT_JOBS_PAGE_SIZE,
+        concurrency=1,
+        jobs_prefetch_pages=DEFAULT_JOBS_PREFETCH_PAGES,
+        discard=False,
+        **kwargs,
+    ):
         super().__init__()
+        self.page_size = jobs_page_size
+        self.concurrency = concurrency
+        self.prefetch_pages = jobs_prefetch_pages
+        self.discard = discard
+
+    def id_from_value(self, v) -> JobId:
+        return JobId(**v)
 
     def singular(self) -> str:
         return "Job"
 
     async def list_running(
-        self, session: aiohttp.ClientSession, projects: List[Project]
-    ) -> List[Execution[str]]:
-        # TODO
-        # Iterate Projects GET /projects/portfolio/getProjectPortfolio
-        # GET /jobs?projectId
-        return []
-
-    def stop(self, _id: str):
-        # TODO
-        # POST /jobs/stop
-        return
-
-    def start(self, _id: str):
-        # TODO
-        raise NotImplementedError("Relaunching Jobs is not implemented.")
+        self, transport: Transport, projects: List[Project]
+    ) -> List[Execution[JobId]]:
+        return (
+            await scan_projects(transport, projects, [self], self.concurrency)
+        )[self.singular()]
 
-    def is_stopped(self, _id: str) -> bool:
-        # TODO
-        # GET /jobs/{jobId}
-        # statuses.executionStatus
+    def scans_by_project(self) -> bool:
         return True
 
-    def is_running(self, _id: str) -> bool:
-        # TODO
-        # GET /jobs/{jobId}
-        # statuses.executionStatus
+    async def list_running_in_project(
+        self, transport: Transport, project: Project
+    ) -> List[Execution[JobId]]:
+        running_executions = []
+        try:
+            # Only running Jobs are kept as pages arrive, a project's
+            # history is never held in memory
+            async with aclosing(self.pages(transport, project._id)) as pages:
+                async for jobs in pages:
+                    for job in jobs:
+                        if _is_stopped(job["statuses"]):
+                            continue
+                        running_executions.append(
+                            Execution(
+                                JobId(job["id"], project._id),
+                                f"{project.name} #{job['number']}",
+                                job["startedBy"]["username"],
+                            )
+                        )
+        except Exception as e:
+            logger.error(
+                (
+                    f"Exception while querying Jobs for "
+                    f"project '{project._id}': {e}"
+                )
+            )
+
+        return running_executions
+
+    async def __page(
+        self, transport: Transport, project_id: str, page: int
+    ) -> dict:
+        return await transport.get(
+            f"/v4/jobs?projectId={project_id}&page_no={page}"
+            f"&page_size={self.page_size}&sort_by=number&order=desc"
+        )
+
+    async def pages(
+        self,
+        transport: Transport,
+        project_id: str,
+        prefetch_pages: Optional[int] = None,
+    ) -> AsyncGenerator[List[dict], None]:
+        """Yield pages of a project's Jobs, newest first.
+
+        The first page tells us how many pages there are, after which up to
+        `prefetch_pages`, by default `self.prefetch_pages`, pages are
+        requested ahead of the one being yielded.
+        """
+        if prefetch_pages is None:
+            prefetch_pages = self.prefetch_pages
+        first = await self.__page(transport, project_id, 1)
+        yield first["jobs"]
+
+        page_count = math.ceil(first["totalCount"] / self.page_size)
+        next_page = 2
+        pending: Deque[asyncio.Task] = deque()
+        try:
+            while next_page <= page_count or len(pending) > 0:
+                while (
+                    next_page <= page_count and len(pending) <= prefetch_pages
+                ):
+                    pending.append(
+                        asyncio.ensure_future(
+                            self.__page(transport, project_id, next_page)
+                        )
+                    )
+                    next_page += 1
+                data = await pending.popleft()
+                if len(data["jobs"]) == 0:
+                    return
+                yield data["jobs"]
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def stop(self, transport: Transport, _id: JobId):
+        await transport.post(
+            "/v4/jobs/stop",
+            json={
+                "projectId": _id.projectId,
+                "jobId": _id._id,
+                "commitResults": not self.discard,
+            },
+        )
+
+    async def start(self, transport: Transport, _id: JobId):
+        raise NotImplementedError("Relaunching Jobs is not implemented.")
+
+    async def is_stopped(self, transport: Transport, _id: JobId) -> bool:
+        job = await transport.get(f"/v4/jobs/{_id._id}")
+        return _is_stopped(job["statuses"])
+
+    async def is_running(self, transport: Transport, _id: JobId) -> bool:
+        job = await transport.get(f"/v4/jobs/{_id._id}")
+        return job["statuses"]["executionStatus"] in RUNNING_STATES
+
+    def supports_status_many(self) -> bool:
         return True
 
+    async def status_many(
+        self,
+        transport: Transport,
+        ids: List[JobId],
+        concurrency: int = 1,
+    ) -> List[Optional[ExecutionStatus]]:
+        ids_by_project: Dict[str, set] = {}
+        for _id in ids:
+            ids_by_project.setdefault(_id.projectId, set()).add(_id._id)
+
+        async def list_statuses(project_id: str) -> Dict[str, dict]:
+            wanted = ids_by_project[project_id]
+            statuses: Dict[str, dict] = {}
+            try:
+                # Jobs being stopped are recent, so are usually all found
+                # on the first pages. Paging stops once they are, so no
+                # pages are requested speculatively.
+                async with aclosing(
+                    self.pages(transport, project_id, prefetch_pages=0)
+                ) as p:
+                    async for jobs in p:
+                        for job in jobs:
+                            if job["id"] in wanted:
+                                statuses[job["id"]] = job["statuses"]
+                        if len(statuses) == len(wanted):
+                            break
+            except Exception as e:
+                # Only the Jobs of this project are polled again later
+                logger.warning(
+                    f"Unable to get Jobs of project '{project_id}': {e}"
+                )
+            return statuses
+
+        statuses: Dict[str, dict] = {}
+        for found in await gather_with_concurrency(
+            concurrency, *map(list_statuses, ids_by_project)
+        ):
+            statuses.update(found)
+        return [
+            (
+                ExecutionStatus(
+                    _is_stopped(statuses[_id._id]),
+                    statuses[_id._id]["executionStatus"] in RUNNING_STATES,
+                )
+                if _id._id in statuses
+                else None
+            )
+            for _id in ids
+        ]
+
     def is_restartable(self) -> bool:
         return False
@@ -1,15 +1,18 @@
+import asyncio
 import logging
+from contextlib import aclosing
 from dataclasses import dataclass
-from typing import List
-
-import aiohttp
-from tqdm import tqdm  # type: ignore
+from typing import AsyncGenerator, Dict, List, Optional
 
+from domino_maintenance_mode import progress
 from domino_maintenance_mode.execution_interface import (
     Execution,
     ExecutionInterface,
+    ExecutionStatus,
 )
+from domino_maintenance_mode.project_scan import scan_projects
 from domino_maintenance_mode.projects import Project
+from domino_maintenance_mode.transport import Transport
 from domino_maintenance_mode.util import gather_with_concurrency
 
 # From ModelVersionStatus.scala
@@ -26,6 +29,8 @@ RUNNING_OR_LAUNCHING_STATES = {
 logger = logging.getLogger(__name__)
 
 DEFAULT_MODELS_PAGE_SIZE = 10
+DEFAULT_MODELS_CONCURRENCY = 10
+DEFAULT_PREFETCH_PAGES = 2
 
 
 @dataclass
@@ -38,16 +43,22 @@ class ModelVersionId:
 class Interface(ExecutionInterface[ModelVersionId]):
     page_size: int
     concurrency: int
+    prefetch_pages: int
 
     def __init__(
         self,
         models_page_size=DEFAULT_MODELS_PAGE_SIZE,
         concurrency=1,
+        models_concurrency=DEFAULT_MODELS_CONCURRENCY,
+        prefetch_pages=DEFAULT_PREFETCH_PAGES,
         **kwargs,
     ):
         super().__init__()
         self.page_size = models_page_size
         self.concurrency = concurrency
+        self.prefetch_pages = prefetch_pages
+        # Shared by all projects to bound the number of models in flight
+        self.models_semaphore = asyncio.Semaphore(models_concurrency)
 
     def id_from_value(self, v) -> ModelVersionId:
         return ModelVersionId(**v)
@@ -56,29 +67,24 @@ class Interface(ExecutionInterface[ModelVersionId]):
         return "Model API Version"
 
     async def list_running(
-        self, session: aiohttp.ClientSession, projects: List[Project]
+        self, transport: Transport, projects: List[Project]
     ) -> List[Execution[ModelVersionId]]:
-        logger.info("Scanning Models by Project")
-        pbar = tqdm(total=len(projects), desc="Projects")
-        ret = await gather_with_concurrency(
-            self.concurrency,
-            *[
-                self.list_models_by_project(session, project, pbar)
-                for project in projects
-            ],
-        )
+        return (
+            await scan_projects(transport, projects, [self], self.concurrency)
+        )[self.singular()]
 
-        return [item for sublist in ret for item in sublist]
+    def scans_by_project(self) -> bool:
+        return True
 
-    async def list_models_by_project(
-        self, session: aiohttp.ClientSession, project: Project, pbar
+    async def list_running_in_project(
+        self, transport: Transport, project: Project
     ) -> List[Execution[ModelVersionId]]:
         running_executions = []
         models: dict = {}
 
         try:
-            models = await self.async_get(
-                session, f"/v4/modelManager/getModels?projectId={project._id}"
+            models = await transport.get(
+                f"/v4/modelManager/getModels?projectId={project._id}"
             )
         except Exception as e:
             logger.error(
@@ -88,21 +94,27 @@ class Interface(ExecutionInterface[ModelVersionId]):
                 )
             )
 
-        for model in tqdm(models, desc="Models"):
+        scanned = progress.counter("Model", "scan", total=len(models))
+        for executions in await asyncio.gather(
+            *[
+                self.list_running_versions(transport, model, scanned)
+                for model in models
+            ]
+        ):
+            running_executions.extend(executions)
+
+        return running_executions
+
+    async def list_running_versions(
+        self,
+        transport: Transport,
+        model: dict,
+        scanned: progress.ProgressCounter,
+    ) -> List[Execution[ModelVersionId]]:
+        running_executions = []
+        async with self.models_semaphore:
             try:
-                versions = []
-                page = 1
-                query = f"pageNumber={page}&pageSize={self.page_size}"
-                data = await self.async_get(
-                    session, f"/models/{model['id']}/versions/json?{query}"
-                )
-                while len(data["results"]) > 0:
-                    versions.extend(data["results"])
-                    page += 1
-                    query = f"pageNumber={page}&pageSize={self.page_size}"
-                    data = await self.async_get(
-                        session, f"/models/{model['id']}/versions/json?{query}"
-                    )
+                versions = await self.list_versions(transport, model["id"])
                 for version in versions:
                     if (
                         version["deploymentStatus"]["name"]
@@ -129,36 +141,163 @@ class Interface(ExecutionInterface[ModelVersionId]):
                     )
                 )
 
-        pbar.update(1)
+        scanned.update()
 
         return running_executions
 
-    def stop(self, _id: ModelVersionId):
-        self.post(f"/v4/models/{_id.modelId}/{_id._id}/stopModelDeployment")
+    async def list_versions(
+        self, transport: Transport, model_id: str
+    ) -> List[dict]:
+        """List all versions of a model."""
+        versions: List[dict] = []
+        async with aclosing(self.version_pages(transport, model_id)) as pages:
+            async for results in pages:
+                versions.extend(results)
+        return versions
+
+    async def version_pages(
+        self,
+        transport: Transport,
+        model_id: str,
+        prefetch_pages: Optional[int] = None,
+    ) -> AsyncGenerator[List[dict], None]:
+        """Yield pages of a model's versions.
+
+        Once a full page has been returned the following `prefetch_pages`
+        pages, by default `self.prefetch_pages`, are requested speculatively
+        alongside the next page.
+        """
+        if prefetch_pages is None:
+            prefetch_pages = self.prefetch_pages
+        page = 1
+        window = 1
+        while True:
+            pages = await asyncio.gather(
+                *[
+                    transport.get(
+                        f"/models/{model_id}/versions/json?"
+                        f"pageNumber={page + i}&pageSize={self.page_size}",
+                    )
+                    for i in range(window)
+                ]
+            )
+            for data in pages:
+                if len(data["results"]) == 0:
+                    return
+                yield data["results"]
+            page += window
+            window = (
+                prefetch_pages + 1
+                if len(pages[-1]["results"]) >= self.page_size
+                else 1
+            )
 
-    def start(self, _id: ModelVersionId):
+    async def stop(self, transport: Transport, _id: ModelVersionId):
+        await transport.post(
+            f"/v4/models/{_id.modelId}/{_id._id}/stopModelDeployment",
+        )
+
+    async def start(self, transport: Transport, _id: ModelVersionId):
         if _id.isActive:
-            self.post(
-                f"/v4/models/{_id.modelId}/{_id._id}/startModelDeployment"
+            await transport.post(
+                f"/v4/models/{_id.modelId}/{_id._id}/startModelDeployment",
             )
 
-    def is_stopped(self, _id: ModelVersionId) -> bool:
-        version = self.get(f"/models/{_id.modelId}/versions/{_id._id}/json")[
-            "result"
-        ]
+    async def is_stopped(
+        self, transport: Transport, _id: ModelVersionId
+    ) -> bool:
+        version = (
+            await transport.get(
+                f"/models/{_id.modelId}/versions/{_id._id}/json"
+            )
+        )["result"]
         return (
             version["deploymentStatus"]["name"] in STOPPED_STATES
             and not version["deploymentStatus"]["isPending"]
         )
 
-    def is_running(self, _id: ModelVersionId) -> bool:
+    async def is_running(
+        self, transport: Transport, _id: ModelVersionId
+    ) -> bool:
         if _id.isActive:
-            version = self.get(
-                f"/models/{_id.modelId}/versions/{_id._id}/json"
+            version = (
+                await transport.get(
+                    f"/models/{_id.modelId}/versions/{_id._id}/json"
+                )
             )["result"]
             return version["deploymentStatus"]["name"] in RUNNING_STATES
         else:
             return True
 
+    def supports_status_many(self) -> bool:
+        return True
+
+    async def status_many(
+        self,
+        transport: Transport,
+        ids: List[ModelVersionId],
+        concurrency: int = 1,
+    ) -> List[Optional[ExecutionStatus]]:
+        ids_by_model: Dict[str, set] = {}
+        for _id in ids:
+            ids_by_model.setdefault(_id.modelId, set()).add(_id._id)
+
+        async def list_statuses(model_id: str) -> Dict[str, dict]:
+            wanted = ids_by_model[model_id]
+            statuses: Dict[str, dict] = {}
+            try:
+                if len(wanted) == 1:
+                    # A single version is fetched in one request
+                    (version_id,) = wanted
+                    version = (
+                        await transport.get(
+                            f"/models/{model_id}/versions/{version_id}/json"
+                        )
+                    )["result"]
+                    statuses[version_id] = version["deploymentStatus"]
+                    return statuses
+                # Paging stops once every version is found, so no pages are
+                # requested speculatively
+                async with aclosing(
+                    self.version_pages(transport, model_id, prefetch_pages=0)
+                ) as pages:
+                    async for versions in pages:
+                        for version in versions:
+                            if version["id"] in wanted:
+                                statuses[version["id"]] = version[
+                                    "deploymentStatus"
+                                ]
+                        if len(statuses) == len(wanted):
+                            break
+            except Exception as e:
+                # Only the versions of this model are polled again later
+                logger.warning(
+                    f"Unable to get versions of Model '{model_id}': {e}"
+                )
+            return statuses
+
+        statuses: Dict[str, dict] = {}
+        for found in await gather_with_concurrency(
+            concurrency, *map(list_statuses, ids_by_model)
+        ):
+            statuses.update(found)
+        return [
+            (
+                ExecutionStatus(
+                    statuses[_id._id]["name"] in STOPPED_STATES
+                    and not statuses[_id._id]["isPending"],
+                    not _id.isActive
+                    or statuses[_id._id]["name"] in RUNNING_STATES,
+                )
+                if _id._id in statuses
+                else None
+            )
+            for _id in ids
+        ]
+
+    def shard_key(self, _id: ModelVersionId) -> str:
+        # Versions of a Model are fetched together by `status_many`
+        return _id.modelId
+
     def is_restartable(self) -> bool:
         return True
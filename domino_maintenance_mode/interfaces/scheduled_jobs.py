@@ -1,15 +1,15 @@
 import logging
 from dataclasses import dataclass
-from typing import List
-
-import aiohttp
-from tqdm import tqdm  # type: ignore
+from typing import Dict, List, Optional
 
 from domino_maintenance_mode.execution_interface import (
     Execution,
     ExecutionInterface,
+    ExecutionStatus,
 )
+from domino_maintenance_mode.project_scan import scan_projects
 from domino_maintenance_mode.projects import Project
+from domino_maintenance_mode.transport import Transport
 from domino_maintenance_mode.util import gather_with_concurrency
 
 logger = logging.getLogger(__name__)
@@ -35,29 +35,24 @@ class Interface(ExecutionInterface[ScheduledJobId]):
         return "Scheduled Job"
 
     async def list_running(
-        self, session: aiohttp.ClientSession, projects: List[Project]
+        self, transport: Transport, projects: List[Project]
     ) -> List[Execution[ScheduledJobId]]:
-        logger.info("Scanning Scheduled Jobs by Project")
-        pbar = tqdm(total=len(projects), desc="Projects")
-        ret = await gather_with_concurrency(
-            self.concurrency,
-            *[
-                self.list_scheduled_jobs_by_project(session, project, pbar)
-                for project in projects
-            ],
-        )
+        return (
+            await scan_projects(transport, projects, [self], self.concurrency)
+        )[self.singular()]
 
-        return [item for sublist in ret for item in sublist]
+    def scans_by_project(self) -> bool:
+        return True
 
-    async def list_scheduled_jobs_by_project(
-        self, session: aiohttp.ClientSession, project: Project, pbar
+    async def list_running_in_project(
+        self, transport: Transport, project: Project
     ) -> List[Execution[ScheduledJobId]]:
         running_executions = []
         jobs: dict = {}
 
         try:
-            jobs = await self.async_get(
-                session, f"/v4/projects/{project._id}/scheduledjobs"
+            jobs = await transport.get(
+                f"/v4/projects/{project._id}/scheduledjobs"
             )
         except Exception as e:
             logger.error(
@@ -66,7 +61,7 @@ class Interface(ExecutionInterface[ScheduledJobId]):
                     f"for Project '{project._id}': {e}"
                 )
             )
-        for job in tqdm(jobs, desc="Scheduled Jobs"):
+        for job in jobs:
             try:
                 if not job["isPaused"]:
                     running_executions.append(
@@ -81,33 +76,90 @@ class Interface(ExecutionInterface[ScheduledJobId]):
                     f"Error parsing Scheduled Job: {job.get('id')}: {e}"
                 )
 
-        pbar.update(1)
-
         return running_executions
 
-    def __update_scheduled_job_is_paused(
-        self, _id: ScheduledJobId, is_paused: bool
-    ):
-        job = self.get(f"/v4/projects/{_id.projectId}/scheduledjobs/{_id.key}")
+    async def __update_scheduled_job_is_paused(
+        self,
+        transport: Transport,
+        _id: ScheduledJobId,
+        is_paused: bool,
+    ) -> bool:
+        path = f"/v4/projects/{_id.projectId}/scheduledjobs/{_id.key}"
+        # Fetched now rather than saved with the snapshot, so that edits made
+        # since are not overwritten
+        job = await transport.get(path)
         job["isPaused"] = is_paused
-        self.put(
-            f"/v4/projects/{_id.projectId}/scheduledjobs/{_id.key}",
-            json=job,
+        updated = await transport.put(path, json=job)
+        if isinstance(updated, dict):
+            return updated.get("isPaused") == is_paused
+        return False
+
+    async def stop(self, transport: Transport, _id: ScheduledJobId) -> bool:
+        return await self.__update_scheduled_job_is_paused(
+            transport, _id, True
         )
 
-    def stop(self, _id: ScheduledJobId):
-        self.__update_scheduled_job_is_paused(_id, True)
-
-    def start(self, _id: ScheduledJobId):
-        self.__update_scheduled_job_is_paused(_id, False)
+    async def start(self, transport: Transport, _id: ScheduledJobId) -> bool:
+        return await self.__update_scheduled_job_is_paused(
+            transport, _id, False
+        )
 
-    def is_stopped(self, _id: ScheduledJobId) -> bool:
-        job = self.get(f"/v4/projects/{_id.projectId}/scheduledjobs/{_id.key}")
+    async def is_stopped(
+        self, transport: Transport, _id: ScheduledJobId
+    ) -> bool:
+        job = await transport.get(
+            f"/v4/projects/{_id.projectId}/scheduledjobs/{_id.key}"
+        )
         return job["isPaused"]
 
-    def is_running(self, _id: ScheduledJobId) -> bool:
-        job = self.get(f"/v4/projects/{_id.projectId}/scheduledjobs/{_id.key}")
+    async def is_running(
+        self, transport: Transport, _id: ScheduledJobId
+    ) -> bool:
+        job = await transport.get(
+            f"/v4/projects/{_id.projectId}/scheduledjobs/{_id.key}"
+        )
         return not job["isPaused"]
 
+    def supports_status_many(self) -> bool:
+        return True
+
+    async def status_many(
+        self,
+        transport: Transport,
+        ids: List[ScheduledJobId],
+        concurrency: int = 1,
+    ) -> List[Optional[ExecutionStatus]]:
+        project_ids = list({_id.projectId for _id in ids})
+
+        async def list_jobs(project_id: str) -> List[dict]:
+            try:
+                return await transport.get(
+                    f"/v4/projects/{project_id}/scheduledjobs"
+                )
+            except Exception as e:
+                # Only the jobs of this project are polled again later
+                logger.warning(
+                    "Unable to get Scheduled Jobs of "
+                    f"Project '{project_id}': {e}"
+                )
+                return []
+
+        jobs_by_project = await gather_with_concurrency(
+            concurrency, *map(list_jobs, project_ids)
+        )
+        paused: Dict[str, bool] = {
+            job["id"]: job["isPaused"]
+            for jobs in jobs_by_project
+            for job in jobs
+        }
+        return [
+            (
+                ExecutionStatus(paused[_id.key], not paused[_id.key])
+                if _id.key in paused
+                else None
+            )
+            for _id in ids
+        ]
+
     def is_restartable(self) -> bool:
         return True
@@ -2,14 +2,14 @@ import logging
 from dataclasses import dataclass
 from typing import Any, Dict, List
 
-import aiohttp
-from tqdm import tqdm  # type: ignore
-
+from domino_maintenance_mode import progress
 from domino_maintenance_mode.execution_interface import (
     Execution,
     ExecutionInterface,
 )
 from domino_maintenance_mode.projects import Project
+from domino_maintenance_mode.transport import Transport
+from domino_maintenance_mode.util import gather_with_concurrency
 
 # From WorkspaceState.scala
 RUNNING_OR_LAUNCHING_STATES = {
@@ -33,10 +33,12 @@ class WorkspaceId:
 
 class Interface(ExecutionInterface[WorkspaceId]):
     page_size: int
+    concurrency: int
 
-    def __init__(self, workspaces_page_size=None, **kwargs):
+    def __init__(self, workspaces_page_size=None, concurrency=1, **kwargs):
         super().__init__()
         self.page_size = workspaces_page_size
+        self.concurrency = concurrency
 
     def id_from_value(self, v) -> WorkspaceId:
         return WorkspaceId(**v)
@@ -45,7 +47,7 @@ class Interface(ExecutionInterface[WorkspaceId]):
         return "Workspace"
 
     async def list_running(
-        self, session: aiohttp.ClientSession, projects: List[Project]
+        self, transport: Transport, projects: List[Project]
     ) -> List[Execution[WorkspaceId]]:
         logger.info(f"Scanning Workspaces. Page size: {self.page_size}")
 
@@ -53,39 +55,53 @@ class Interface(ExecutionInterface[WorkspaceId]):
             (project.owner, project.name): project._id for project in projects
         }
 
-        offset = 0
         workspaces: Dict[str, Any] = {}
+
+        async def fetch_page(offset: int) -> int:
+            params = f"limit={self.page_size}&offset={offset}"
+            data = await transport.get(
+                f"{BASE_PATH}/adminDashboardRowData?{params}"
+            )
+            last_count = len(workspaces)
+            for entry in data.get("tableRows", []):
+                entry["projectId"] = project_lookup.get(
+                    (entry["projectOwnerName"], entry["projectName"])
+                )
+                workspaces[entry["workspaceId"]] = entry
+            logger.debug(
+                (
+                    f"Got {len(data.get('tableRows', []))}"
+                    f" entries, {len(workspaces) - last_count} new,"
+                    f" offset: {offset},"
+                    f" limit: {self.page_size}"
+                )
+            )
+            return data["totalEntries"]
+
         try:
-            while True:
-                params = f"limit={self.page_size}&offset={offset}"
-                data = self.get(f"{BASE_PATH}/adminDashboardRowData?{params}")
-                last_count = len(workspaces)
-                for entry in data.get("tableRows", []):
-                    project_id = project_lookup[
-                        (entry["projectOwnerName"], entry["projectName"])
-                    ]
-                    entry["projectId"] = project_id
-                    workspaces[entry["workspaceId"]] = entry
-                logger.debug(
+            # The first page tells us how many pages remain, which are then
+            # fetched concurrently.
+            total = await fetch_page(0)
+            fetched = self.page_size
+            while len(workspaces) < total and fetched < total:
+                totals = await gather_with_concurrency(
+                    self.concurrency,
+                    *[
+                        fetch_page(offset)
+                        for offset in range(fetched, total, self.page_size)
+                    ],
+                )
+                fetched = total
+                # If the list of workspaces has grown, fetch the new pages
+                total = max(totals)
+            if len(workspaces) < total:
+                raise Exception(
                     (
-                        f"Got {len(data.get('tableRows', []))}"
-                        f" entries, {len(workspaces) - last_count} new,"
-                        f" offset: {offset},"
-                        f" limit: {self.page_size}"
+                        "Number of Workspaces found did not match"
+                        " 'totalEntries':"
+                        f" {len(workspaces)}/{total}"
                     )
                 )
-                if len(workspaces) >= data["totalEntries"]:
-                    break
-                offset += self.page_size
-                # If the list of workspaces has changed, loop again
-                if offset >= data["totalEntries"]:
-                    raise Exception(
-                        (
-                            "Number of Workspaces found did not match"
-                            " 'totalEntries':"
-                            f" {len(workspaces)}/{data['totalEntries']}"
-                        )
-                    )
         except Exception as e:
             logger.error(
                 (
@@ -94,22 +110,37 @@ class Interface(ExecutionInterface[WorkspaceId]):
                 )
             )
 
+        scanned = progress.counter(
+            self.singular(), "scan", total=len(workspaces)
+        )
         running_executions = []
-        for workspace in tqdm(
-            workspaces.values(), desc="Workspaces", total=len(workspaces)
-        ):
+        for workspace in workspaces.values():
+            scanned.update()
             try:
-                if workspace["workspaceState"] in RUNNING_OR_LAUNCHING_STATES:
-                    running_executions.append(
-                        Execution(
-                            WorkspaceId(
-                                workspace["workspaceId"],
-                                workspace["projectId"],
-                            ),
-                            f"{workspace['projectName']}/{workspace['name']}",
-                            f"{workspace['ownerUsername']}",
+                state = workspace["workspaceState"]
+                if state not in RUNNING_OR_LAUNCHING_STATES:
+                    continue
+                if workspace["projectId"] is None:
+                    logger.error(
+                        (
+                            f"Workspace {workspace['workspaceId']} is in"
+                            " unknown project"
+                            f" '{workspace['projectOwnerName']}/"
+                            f"{workspace['projectName']}', it will not be"
+                            " stopped."
                         )
                     )
+                    continue
+                running_executions.append(
+                    Execution(
+                        WorkspaceId(
+                            workspace["workspaceId"],
+                            workspace["projectId"],
+                        ),
+                        f"{workspace['projectName']}/{workspace['name']}",
+                        f"{workspace['ownerUsername']}",
+                    )
+                )
             except Exception as e:
                 logger.error(
                     (
@@ -119,24 +150,24 @@ class Interface(ExecutionInterface[WorkspaceId]):
                 )
         return running_executions
 
-    def stop(self, _id: WorkspaceId):
-        self.post(
-            f"{BASE_PATH}/project/{_id.projectId}/workspace/{_id._id}/stop"
+    async def stop(self, transport: Transport, _id: WorkspaceId):
+        await transport.post(
+            f"{BASE_PATH}/project/{_id.projectId}/workspace/{_id._id}/stop",
         )
 
-    def start(self, _id: WorkspaceId):
+    async def start(self, transport: Transport, _id: WorkspaceId):
         raise NotImplementedError("Relaunching Workspaces is not implemented.")
 
-    def is_stopped(self, _id: WorkspaceId) -> bool:
-        workspace = self.get(
+    async def is_stopped(self, transport: Transport, _id: WorkspaceId) -> bool:
+        workspace = await transport.get(
             f"{BASE_PATH}/project/{_id.projectId}/workspace/{_id._id}"
         )
         return workspace["mostRecentSession"]["sessionStatusInfo"][
             "isCompleted"
         ]
 
-    def is_running(self, _id: WorkspaceId) -> bool:
-        workspace = self.get(
+    async def is_running(self, transport: Transport, _id: WorkspaceId) -> bool:
+        workspace = await transport.get(
             f"{BASE_PATH}/project/{_id.projectId}/workspace/{_id._id}"
         )
         return workspace["mostRecentSession"]["sessionStatusInfo"]["isRunning"]
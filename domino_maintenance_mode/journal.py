@@ -0,0 +1,128 @@
+import datetime
+import json
+import logging
+import os
+from typing import Dict, List, Set, Tuple
+
+from domino_maintenance_mode.execution_interface import (
+    Execution,
+    execution_key,
+)
+
+logger = logging.getLogger(__name__)
+
+# A stop / start request was accepted by the API
+REQUESTED = "requested"
+# The execution was observed in the desired state
+CONFIRMED = "confirmed"
+# The request failed `max_failures` times
+FAILED = "failed"
+# The execution did not reach the desired state within the grace period
+TIMEOUT = "timeout"
+
+
+class Journal:
+    """Append-only NDJSON log of every state change made by the Manager.
+
+    Each line is written and flushed as it happens, so after an interruption
+    the journal can be re-opened with `resume` to pick up where it left off.
+    """
+
+    def __init__(self, path: str, resume: bool = False):
+        self.path = path
+        self.__progress: Dict[Tuple[str, str], Dict[str, str]] = {}
+        if os.path.exists(path):
+            if resume:
+                self.__load()
+            else:
+                logger.warning(
+                    f"Journal '{path}' already exists, pass '--resume' to"
+                    " skip executions it records as complete."
+                )
+        self.__file = open(path, "a")
+
+    def __enter__(self) -> "Journal":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __load(self):
+        self.__progress = read_journal(self.path)
+        logger.info(f"Resuming from journal '{self.path}'.")
+
+    def close(self):
+        self.__file.close()
+
+    def record(
+        self, event: str, verb: str, singular: str, execution: Execution
+    ):
+        key = execution_key(execution)
+        self.__file.write(
+            json.dumps(
+                {
+                    "time": datetime.datetime.now().isoformat(),
+                    "event": event,
+                    "verb": verb,
+                    "type": singular,
+                    "key": key,
+                    "name": execution.name,
+                }
+            )
+            + "\n"
+        )
+        self.__file.flush()
+        self.__progress.setdefault((verb, singular), {})[key] = event
+
+    def latest(self) -> Dict[Tuple[str, str], Dict[str, str]]:
+        """The latest event of each execution by key, by (verb, type)."""
+        return {k: dict(v) for k, v in self.__progress.items()}
+
+    def with_event(self, event: str, verb: str, singular: str) -> Set[str]:
+        """Keys of executions whose latest event is `event`."""
+        return {
+            key
+            for key, latest in self.__progress.get(
+                (verb, singular), {}
+            ).items()
+            if latest == event
+        }
+
+
+def read_journal(path: str) -> Dict[Tuple[str, str], Dict[str, str]]:
+    """The latest event of each execution by key, by (verb, type), in the
+    journal at `path`.
+    """
+    progress: Dict[Tuple[str, str], Dict[str, str]] = {}
+    with open(path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # Partially written final line
+                continue
+            progress.setdefault((entry["verb"], entry["type"]), {})[
+                entry["key"]
+            ] = entry["event"]
+    return progress
+
+
+def merge_journals(paths: List[str], output: str) -> int:
+    """Combine journals into one at `output`, ordered by time.
+
+    Returns the number of events written.
+    """
+    entries = []
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # Partially written final line
+                    continue
+    entries.sort(key=lambda entry: entry["time"])
+    with open(output, "x") as f:
+        for entry in entries:
+            f.write(json.dumps(entry) + "\n")
+    return len(entries)
@@ -1,206 +1,552 @@
+import asyncio
 import datetime
-import json
 import logging
+import random
 import time
-from dataclasses import asdict, dataclass, is_dataclass
-from typing import Any, Dict, List, Optional
+from asyncio import run as aiorun
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
+from domino_maintenance_mode import progress
 from domino_maintenance_mode.execution_interface import (
     Execution,
     ExecutionInterface,
+    ExecutionStatus,
+    execution_key,
 )
+from domino_maintenance_mode.failure_log import FailureLog
+from domino_maintenance_mode.journal import (
+    CONFIRMED,
+    FAILED,
+    REQUESTED,
+    TIMEOUT,
+    Journal,
+)
+from domino_maintenance_mode.metrics import TOGGLE_RETRIES, timed_phase
+from domino_maintenance_mode.rate_limit import AdaptiveRateLimiter
+from domino_maintenance_mode.scheduling import DelayQueue
+from domino_maintenance_mode.sharding import Shard, shard_label
+from domino_maintenance_mode.transport import Transport
 
 logger = logging.getLogger(__name__)
 
+# Status polling backs off per execution from the initial to the max interval
+POLL_INTERVAL_S = 1.0
+MAX_POLL_INTERVAL_S = 30.0
+POLL_BACKOFF_FACTOR = 1.5
+# Failed stop / start calls are retried per execution with backoff
+RETRY_INTERVAL_S = 1.0
+MAX_RETRY_INTERVAL_S = 60.0
+RETRY_BACKOFF_FACTOR = 2.0
+
+# The state an execution is waited on to reach, by verb
+DESIRED_STATES = {"stop": "stopped", "start": "running"}
+
 
 @dataclass
 class BatchCallResult:
     failed: List[Execution]
+    # Requested, but not yet confirmed in the desired state
     success: List[Execution]
+    confirmed: List[Execution] = field(default_factory=list)
+    # Calls made per execution key
+    attempts: Dict[str, int] = field(default_factory=dict)
 
 
 class Manager:
     batch_size: int
-    batch_interval_s: int
     max_failures: int
     grace_period_s: int
     failures: dict = dict()
 
     def __init__(
         self,
-        service: str = None,
+        service: Optional[str] = None,
         batch_size: int = 5,
-        batch_interval_s: int = 5,
+        batch_interval_s: Optional[int] = None,
+        max_rps: Optional[float] = None,
         max_failures: int = 5,
         grace_period_s: int = 600,
+        transport: Optional[Transport] = None,
+        journal: Optional[Journal] = None,
+        shard: Optional[Shard] = None,
+        failure_log: Optional[FailureLog] = None,
     ):
-        self.batch_size = batch_size
-        self.batch_interval_s = batch_interval_s
+        if batch_interval_s is not None:
+            logger.warning(
+                "'batch_interval_s' is deprecated and ignored, API calls are"
+                " now paced adaptively. Use 'max_rps' to cap request rate."
+            )
+        # '-b 0' is accepted, but at least one call must be in flight
+        self.batch_size = max(batch_size, 1)
         self.grace_period_s = grace_period_s
         self.max_failures = max_failures
         self.service = service
+        self.journal = journal
+        self.shard = shard
+        # Shared by every stop and start of this manager, created on first use
+        self.failure_log = failure_log
+        self.transport = transport or Transport(
+            AdaptiveRateLimiter(max_rps, max_concurrency=self.batch_size)
+        )
 
     def get_service(self):
         return self.service
 
+    def __record(
+        self, event: str, verb: str, singular: str, execution: Execution
+    ):
+        if self.journal is not None:
+            self.journal.record(event, verb, singular, execution)
+
     def stop(self, interface: ExecutionInterface, executions: List[Execution]):
-        self.__toggle_executions(
-            "stop",
-            interface.singular(),
-            interface.stop,
-            interface.is_stopped,
-            executions,
-        )
+        self.stop_all([(interface, executions)])
 
     def start(
         self, interface: ExecutionInterface, executions: List[Execution]
     ):
-        self.__toggle_executions(
-            "start",
-            interface.singular(),
-            interface.start,
+        self.start_all([(interface, executions)])
+
+    def stop_all(
+        self, batches: List[Tuple[ExecutionInterface, List[Execution]]]
+    ):
+        """Stop executions of several interfaces at once.
+
+        Every interface is stopped and waited on concurrently, sharing the
+        request budget of `self.transport`, after a single confirmation.
+        """
+        self.__toggle_all("stop", batches)
+
+    def start_all(
+        self, batches: List[Tuple[ExecutionInterface, List[Execution]]]
+    ):
+        """Start executions of several interfaces at once, see `stop_all`."""
+        self.__toggle_all("start", batches)
+
+    def __toggle_funcs(self, verb: str, interface: ExecutionInterface):
+        if verb == "stop":
+            return interface.stop, self.__status_check(
+                interface,
+                interface.is_stopped,
+                lambda status: status.stopped,
+            )
+        return interface.start, self.__status_check(
+            interface,
             interface.is_running,
-            executions,
+            lambda status: status.running,
         )
 
-    def __persist_failed(
+    def __status_check(
+        self,
+        interface: ExecutionInterface,
+        wait_func,
+        ready: Callable[[ExecutionStatus], bool],
+    ):
+        """Build a function which checks whether a group of executions have
+        reached the desired state, in bulk if the interface supports it.
+        """
+        if interface.supports_status_many():
+
+            async def check_many(transport, ids: list) -> List[Optional[bool]]:
+                statuses = await interface.status_many(
+                    transport, ids, self.batch_size
+                )
+                return [
+                    ready(status) if status is not None else None
+                    for status in statuses
+                ]
+
+            return check_many
+
+        async def check_one(transport, ids: list) -> List[bool]:
+            return [await wait_func(transport, _id) for _id in ids]
+
+        return check_one
+
+    def __filter_journal(
+        self, verb: str, singular: str, executions: List[Execution]
+    ) -> Tuple[List[Execution], List[Execution]]:
+        """Split `executions` into those to toggle and those the journal
+        records as requested but not yet confirmed, dropping those it records
+        as complete.
+        """
+        if self.journal is None:
+            return executions, []
+        confirmed = self.journal.with_event(CONFIRMED, verb, singular)
+        requested = self.journal.with_event(REQUESTED, verb, singular)
+        remaining = []
+        awaiting = []
+        for execution in executions:
+            key = execution_key(execution)
+            if key in requested:
+                awaiting.append(execution)
+            elif key not in confirmed:
+                remaining.append(execution)
+        skipped = len(executions) - len(remaining) - len(awaiting)
+        if skipped > 0 or len(awaiting) > 0:
+            logger.info(
+                (
+                    f"Journal records {skipped} {singular}s as complete"
+                    f" and {len(awaiting)} as awaiting confirmation."
+                )
+            )
+        return remaining, awaiting
+
+    def __toggle_all(
         self,
         verb: str,
-        singular: str,
-        session: str,
-        action: List[Execution],
-        wait: Optional[List[Execution]] = None,
+        batches: List[Tuple[ExecutionInterface, List[Execution]]],
     ):
-        path = f"{session}-failed.json"
-        if (wait is None and len(action) > 0) or (
-            wait is not None and len(wait) > 0
-        ):
-            if wait is None:
-                logger.error(
-                    (
-                        f"{len(action)} {singular}s failed to {verb}!"
-                        f" Saving log to '{path}'."
+        plans = []
+        for interface, executions in batches:
+            executions, awaiting = self.__filter_journal(
+                verb, interface.singular(), executions
+            )
+            if len(executions) > 0 or len(awaiting) > 0:
+                plans.append((interface, executions, awaiting))
+        if len(plans) == 0:
+            return
+        counts = [
+            f"{len(executions)} {interface.singular()}s"
+            for interface, executions, _ in plans
+            if len(executions) > 0
+        ]
+        if len(counts) > 1:
+            counts = [", ".join(counts[:-1]), counts[-1]]
+        if len(counts) > 0 and input(
+            f"Are you sure you want to {verb} these {' and '.join(counts)}? "
+        ).lower() not in {"y", "yes"}:
+            return
+        if self.failure_log is None:
+            session = "-".join(
+                [verb]
+                + ([shard_label(self.shard)] if self.shard is not None else [])
+                + [datetime.datetime.now().isoformat()]
+            )
+            self.failure_log = FailureLog(f"{session}-failed.ndjson")
+        with self.failure_log as failure_log:
+            recorded = failure_log.count
+            try:
+                aiorun(self.__async_toggle_all(verb, plans, failure_log))
+            finally:
+                if failure_log.count > recorded:
+                    retry = f'dmm retry "{failure_log.path}"'
+                    logger.error(
+                        (
+                            f"{failure_log.count - recorded} executions"
+                            f" failed to {verb}, see '{failure_log.path}'."
+                            f" Retry them with '{retry}'."
+                        )
                     )
-                )
-            else:
+
+    async def __async_toggle_all(
+        self, verb: str, plans: list, failure_log: FailureLog
+    ):
+        async def toggle(interface, executions, awaiting):
+            toggle_func, wait_func = self.__toggle_funcs(verb, interface)
+            await self.__async_toggle_executions(
+                transport,
+                verb,
+                interface,
+                toggle_func,
+                wait_func,
+                executions,
+                awaiting,
+                failure_log,
+            )
+
+        async with self.transport as transport:
+            results = await asyncio.gather(
+                *(toggle(*plan) for plan in plans), return_exceptions=True
+            )
+        errors = [
+            result for result in results if isinstance(result, Exception)
+        ]
+        for (interface, _, _), result in zip(plans, results):
+            if isinstance(result, Exception) and len(plans) > 1:
                 logger.error(
-                    (
-                        f"{len(wait)} {singular}s timed out!"
-                        " Updating log at '{path}'."
-                    )
+                    f"Failed to {verb} {interface.singular()}s: {result}"
                 )
-            data = {
-                "modify": list(map(asdict, action)),
-                "timeout": list(map(asdict, wait))
-                if wait is not None
-                else None,
-            }
-            with open(path, "w") as f:
-                json.dump(data, f)
-
-    def __toggle_executions(
+        if len(errors) > 0:
+            raise errors[0]
+
+    async def __async_toggle_executions(
         self,
+        transport: Transport,
         verb: str,
-        singular: str,
+        interface: ExecutionInterface,
         toggle_func,
         wait_func,
         executions: List[Execution],
+        awaiting: List[Execution],
+        failure_log: FailureLog,
     ):
-        if input(
-            (
-                f"Are you sure you want to {verb} these"
-                f" {len(executions)} {singular}s? "
+        singular = interface.singular()
+        with timed_phase(singular, "toggle"):
+            try:
+                await interface.prepare(
+                    transport,
+                    verb,
+                    [execution._id for execution in executions],
+                    self.batch_size,
+                )
+            except Exception as e:
+                logger.warn(f"Error preparing to {verb} {singular}s: {e}")
+            result = await self.__batch_call(
+                transport,
+                verb,
+                singular,
+                toggle_func,
+                executions,
+                failure_log,
+            )
+        if len(result.failed) > 0:
+            logger.error(f"{len(result.failed)} {singular}s failed to {verb}!")
+        with timed_phase(singular, "wait"):
+            wait_failed = await self.__wait_condition(
+                transport,
+                verb,
+                singular,
+                wait_func,
+                interface.supports_status_many(),
+                result.success + awaiting,
+            )
+        if len(wait_failed) > 0:
+            logger.error(f"{len(wait_failed)} {singular}s timed out!")
+        for execution, state in wait_failed:
+            self.__record(TIMEOUT, verb, singular, execution)
+            failure_log.record(
+                TIMEOUT,
+                verb,
+                singular,
+                execution,
+                None,
+                result.attempts.get(execution_key(execution), 0),
+                state,
             )
-        ).lower() not in {"y", "yes"}:
-            return
-        session = f"{singular}-{verb}-{datetime.datetime.now().isoformat()}"
-        result = self.__batch_call(verb, singular, toggle_func, executions)
-        self.__persist_failed(verb, singular, session, result.failed)
-        wait_failed = self.__wait_condition(
-            verb, singular, wait_func, result.success
-        )
-        self.__persist_failed(
-            verb, singular, session, result.failed, wait_failed
-        )
 
-    def __batch_call(
-        self, verb: str, singular: str, func, executions: List[Execution]
+    async def __batch_call(
+        self,
+        transport: Transport,
+        verb: str,
+        singular: str,
+        func,
+        executions: List[Execution],
+        failure_log: FailureLog,
     ) -> BatchCallResult:
-        """Batches / rate limits API calls to change execution state."""
+        """Rate limits API calls to change execution state.
+
+        Up to `self.batch_size` calls are in flight at once, the pace is set
+        by the interface's rate limiter. Failed calls are retried after an
+        exponential backoff with jitter per execution, other executions are
+        called in the meantime.
+        """
         success: List[Execution] = []
+        confirmed: List[Execution] = []
         failed: List[Execution] = []
         failures: Dict[Any, int] = {}
-        while len(executions) > 0:
-            batch = [
-                executions.pop()
-                for _ in range(min(len(executions), self.batch_size))
-            ]
+        attempts: Dict[str, int] = {}
+        retries: DelayQueue[Execution] = DelayQueue()
+        in_flight: Dict[asyncio.Task, Execution] = {}
+        concurrency = self.batch_size
+        called = progress.counter(singular, verb, total=len(executions))
+        while len(executions) > 0 or len(in_flight) > 0 or len(retries) > 0:
+            while len(in_flight) < concurrency:
+                retry = retries.pop_due()
+                if retry is not None:
+                    execution = retry
+                elif len(executions) > 0:
+                    execution = executions.pop()
+                else:
+                    break
+                task = asyncio.create_task(func(transport, execution._id))
+                in_flight[task] = execution
+                key = execution_key(execution)
+                attempts[key] = attempts.get(key, 0) + 1
+            if len(in_flight) == 0:
+                await asyncio.sleep(retries.time_until_due() or 0)
+                continue
+            # A due retry can only be started once a call finishes
+            timeout = (
+                retries.time_until_due()
+                if len(in_flight) < concurrency
+                else None
+            )
+            done, _ = await asyncio.wait(
+                in_flight.keys(),
+                timeout=timeout,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
 
-            for execution in batch:
-                try:
-                    func(execution._id)
+            for task in done:
+                execution = in_flight.pop(task)
+                e = task.exception()
+                if e is None and task.result():
+                    called.update()
+                    confirmed.append(execution)
+                    self.__record(CONFIRMED, verb, singular, execution)
+                    logger.info(
+                        f"Successful {verb} of {singular} '{execution.name}'."
+                    )
+                    continue
+                if e is None:
+                    called.update()
                     success.append(execution)
+                    self.__record(REQUESTED, verb, singular, execution)
                     logger.info(
                         (
                             f"Successful {verb} of {singular}"
                             f" '{execution.name}'"
                         )
                     )
-                except Exception as e:
-                    if is_dataclass(execution._id):
-                        key = execution._id._id
-                    else:
-                        key = execution._id
-                    failures[key] = failures.get(key, 0) + 1
-                    if failures[key] < self.max_failures:
-                        logger.warn(
-                            (
-                                f"Failed to {verb} {singular} "
-                                f"'{execution.name}' (retrying): {e}"
-                            )
+                    continue
+                key = execution_key(execution)
+                failures[key] = failures.get(key, 0) + 1
+                if failures[key] < self.max_failures:
+                    TOGGLE_RETRIES.inc(interface=singular, verb=verb)
+                    backoff_s = min(
+                        RETRY_INTERVAL_S
+                        * RETRY_BACKOFF_FACTOR ** (failures[key] - 1),
+                        MAX_RETRY_INTERVAL_S,
+                    )
+                    delay = random.uniform(backoff_s / 2, backoff_s)
+                    logger.warn(
+                        (
+                            f"Failed to {verb} {singular} '{execution.name}'"
+                            f" (retrying in {delay:.1f}s): {e}"
                         )
-                        executions.insert(0, execution)
-                    else:
-                        logger.warn(
-                            (
-                                f"Failed to {verb} {singular} "
-                                f"'{execution.name}': {e}"
-                            )
+                    )
+                    retries.push(execution, delay)
+                else:
+                    logger.warn(
+                        (
+                            f"Failed to {verb} {singular} "
+                            f"'{execution.name}': {e}"
                         )
-                        failed.append(execution)
+                    )
+                    called.update()
+                    failed.append(execution)
+                    self.__record(FAILED, verb, singular, execution)
+                    failure_log.record(
+                        FAILED,
+                        verb,
+                        singular,
+                        execution,
+                        str(e),
+                        attempts[key],
+                        None,
+                    )
+        return BatchCallResult(failed, success, confirmed, attempts)
 
-            if len(executions) > 0:
-                logger.info(f"Batch complete, {len(executions)} remaining.")
-                time.sleep(self.batch_interval_s)
-        return BatchCallResult(failed, success)
+    async def __wait_condition(
+        self,
+        transport: Transport,
+        verb,
+        singular,
+        func,
+        bulk: bool,
+        executions: List[Execution],
+    ) -> List[Tuple[Execution, str]]:
+        """Wait until `func` returns true for all `executions`
 
-    def __wait_condition(
-        self, verb, singular, func, executions: List[Execution]
-    ) -> List[Execution]:
-        """Wait until `func` returns true for all executions in `self.waiting`
+        Up to `self.grace_period_s`. Each execution is re-polled on its own
+        schedule which backs off while it has not reached the desired state.
+        Up to `self.batch_size` executions are polled concurrently, or if
+        `bulk` all executions which are due are polled together in one call.
 
-        Up to `self.grace_period_s`.
+        Returns the executions which timed out, with their last observed
+        state.
         """
-        failed = [execution for execution in executions]
         logger.info(
             f"Waiting up to {self.grace_period_s}s for {singular}s to {verb}."
         )
-        tic = time.time()
-        while len(failed) > 0:
-            if (time.time() - tic) >= self.grace_period_s:
-                return failed
-            execution = failed.pop()
+        pending: DelayQueue = DelayQueue()
+        for execution in executions:
+            pending.push((execution, POLL_INTERVAL_S))
+        # Executions reach the desired state in bursts, not at a steady rate
+        waited = progress.counter(
+            singular, "wait", total=len(executions), eta=False
+        )
+        in_flight: Dict[asyncio.Task, List[Execution]] = {}
+        # Last observed state by execution key
+        states: Dict[str, str] = {}
+
+        async def poll(group: List[Tuple[Execution, float]]):
             try:
-                ready = func(execution._id)
+                ready = await func(
+                    transport, [execution._id for execution, _ in group]
+                )
+                error = None
             except Exception as e:
                 logger.warn(f"Error polling {singular} state: {e}")
-                ready = False
+                ready = [False] * len(group)
+                error = f"unknown ({e})"
 
-            if ready:
-                logger.info(
-                    f"Successful {verb} of {singular} '{execution.name}'."
+            for (execution, interval), is_ready in zip(group, ready):
+                states[execution_key(execution)] = (
+                    error
+                    or ("not found" if is_ready is None else None)
+                    or f"not {DESIRED_STATES[verb]}"
+                )
+                if is_ready:
+                    waited.update()
+                    logger.info(
+                        f"Successful {verb} of {singular} '{execution.name}'."
+                    )
+                    self.__record(CONFIRMED, verb, singular, execution)
+                    continue
+                next_interval = min(
+                    interval * POLL_BACKOFF_FACTOR, MAX_POLL_INTERVAL_S
+                )
+                # Jitter spreads out individual polls, but bulk polls are
+                # kept in step so that they can be grouped together.
+                delay = (
+                    next_interval
+                    if bulk
+                    else random.uniform(interval, next_interval)
                 )
+                pending.push((execution, next_interval), delay)
+
+        deadline = time.monotonic() + self.grace_period_s
+        concurrency = 1 if bulk else self.batch_size
+        while len(pending) > 0 or len(in_flight) > 0:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            while len(in_flight) < concurrency:
+                group: List[Tuple[Execution, float]] = []
+                while len(group) == 0 or bulk:
+                    item = pending.pop_due()
+                    if item is None:
+                        break
+                    group.append(item)
+                if len(group) == 0:
+                    break
+                task = asyncio.create_task(poll(group))
+                in_flight[task] = [execution for execution, _ in group]
+
+            timeout = pending.time_until_due()
+            if timeout is None or len(in_flight) >= concurrency:
+                timeout = remaining
+            if len(in_flight) > 0:
+                done, _ = await asyncio.wait(
+                    in_flight.keys(),
+                    timeout=min(timeout, remaining),
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                for task in done:
+                    del in_flight[task]
             else:
-                failed.insert(0, execution)
-            time.sleep(1)
-        return failed
+                await asyncio.sleep(min(timeout, remaining))
+
+        for task in in_flight:
+            task.cancel()
+        return [
+            (execution, states.get(execution_key(execution), "not polled"))
+            for execution in [
+                execution
+                for group in in_flight.values()
+                for execution in group
+            ]
+            + [execution for execution, _ in pending.drain()]
+        ]
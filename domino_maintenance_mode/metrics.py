@@ -0,0 +1,383 @@
+import bisect
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS_S = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+DEFAULT_EXPORT_INTERVAL_S = 10.0
+
+# Metrics are updated from the event loop and read by the exporter threads
+_lock = threading.RLock()
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Sequence[Tuple[str, str]]) -> str:
+    if len(labels) == 0:
+        return ""
+    return (
+        "{"
+        + ",".join(f'{name}="{_escape(value)}"' for name, value in labels)
+        + "}"
+    )
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Metric:
+    type: str
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self) -> List[Tuple[str, Sequence[Tuple[str, str]], float]]:
+        raise NotImplementedError()
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        for name, labels, value in self._samples():
+            lines.append(
+                f"{name}{_format_labels(labels)} {_format_value(value)}"
+            )
+        return "\n".join(lines) + "\n"
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = self._key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def total(self) -> float:
+        """The sum over all label values."""
+        with _lock:
+            return sum(self.values.values())
+
+    def _samples(self):
+        with _lock:
+            values = sorted(self.values.items())
+        return [
+            (self.name, list(zip(self.labelnames, key)), value)
+            for key, value in values
+        ]
+
+
+class HistogramValue:
+    def __init__(self, buckets: Sequence[float]):
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames=(),
+        buckets: Sequence[float] = LATENCY_BUCKETS_S,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.values: Dict[LabelValues, HistogramValue] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = self._key(labels)
+        with _lock:
+            if key not in self.values:
+                self.values[key] = HistogramValue(self.buckets)
+            histogram = self.values[key]
+            histogram.counts[bisect.bisect_left(self.buckets, value)] += 1
+            histogram.count += 1
+            histogram.sum += value
+            histogram.max = max(histogram.max, value)
+
+    def quantile(self, q: float, **labels: str) -> Optional[float]:
+        """Estimate a quantile by interpolating within buckets, as
+        Prometheus' 'histogram_quantile' does.
+        """
+        with _lock:
+            histogram = self.values.get(self._key(labels))
+            if histogram is None or histogram.count == 0:
+                return None
+            rank = q * histogram.count
+            seen = 0
+            for i, count in enumerate(histogram.counts):
+                if seen + count >= rank and count > 0:
+                    lower = self.buckets[i - 1] if i > 0 else 0.0
+                    upper = (
+                        self.buckets[i]
+                        if i < len(self.buckets)
+                        else histogram.max
+                    )
+                    return min(
+                        lower + (upper - lower) * (rank - seen) / count,
+                        histogram.max,
+                    )
+                seen += count
+            return histogram.max
+
+    def _samples(self):
+        samples = []
+        with _lock:
+            values = sorted(self.values.items())
+            for key, histogram in values:
+                labels = list(zip(self.labelnames, key))
+                cumulative = 0
+                for bound, count in zip(
+                    self.buckets + (float("inf"),), histogram.counts
+                ):
+                    cumulative += count
+                    samples.append(
+                        (
+                            f"{self.name}_bucket",
+                            labels + [("le", _format_value(bound))],
+                            cumulative,
+                        )
+                    )
+                samples.append((f"{self.name}_sum", labels, histogram.sum))
+                samples.append((f"{self.name}_count", labels, histogram.count))
+        return samples
+
+
+REQUEST_DURATION = Histogram(
+    "dmm_request_duration_seconds",
+    "Latency of Domino API requests.",
+    ["method", "endpoint"],
+)
+REQUESTS = Counter(
+    "dmm_requests_total",
+    "Domino API requests by response status, 'error' if none was received.",
+    ["method", "endpoint", "status"],
+)
+REQUEST_RETRIES = Counter(
+    "dmm_request_retries_total",
+    "Domino API requests retried after an error.",
+    ["method", "endpoint"],
+)
+TOGGLE_RETRIES = Counter(
+    "dmm_toggle_retries_total",
+    "Calls to stop or start an execution which were retried.",
+    ["interface", "verb"],
+)
+PHASE_DURATION = Counter(
+    "dmm_phase_seconds_total",
+    "Time spent scanning, toggling and waiting for executions.",
+    ["interface", "phase"],
+)
+
+METRICS: List[Metric] = [
+    REQUEST_DURATION,
+    REQUESTS,
+    REQUEST_RETRIES,
+    TOGGLE_RETRIES,
+    PHASE_DURATION,
+]
+
+# Path segments which are ids rather than part of the route. Domino ids are
+# hex object ids, the API version ('v4') is the only route segment with a
+# digit in it.
+__id_segment = re.compile(r"^(?!v\d+$).*\d")
+
+
+def endpoint_template(path: str) -> str:
+    """Replace the ids in an API path with '{id}', so that requests to the
+    same endpoint are grouped together.
+    """
+    path = path.split("?", 1)[0]
+    return "/".join(
+        "{id}" if __id_segment.match(segment) else segment
+        for segment in path.split("/")
+    )
+
+
+@contextmanager
+def timed_phase(interface: str, phase: str) -> Iterator[None]:
+    """Add the time spent in the block to `phase` of `interface`."""
+    tic = time.monotonic()
+    try:
+        yield
+    finally:
+        PHASE_DURATION.inc(
+            time.monotonic() - tic, interface=interface, phase=phase
+        )
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    return "".join(metric.render() for metric in METRICS)
+
+
+def write_textfile(path: str):
+    """Atomically write all metrics to `path`, for the node exporter's
+    textfile collector.
+    """
+    fd, tmp = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp"
+    )
+    with os.fdopen(fd, "w") as f:
+        f.write(render())
+    os.replace(tmp, path)
+
+
+def summary() -> str:
+    """A table of requests per endpoint followed by time spent per phase."""
+    with _lock:
+        endpoints = sorted(REQUEST_DURATION.values.keys())
+        statuses = dict(REQUESTS.values)
+        retries = dict(REQUEST_RETRIES.values)
+        phases = sorted(PHASE_DURATION.values.items())
+        toggle_retries = dict(TOGGLE_RETRIES.values)
+    lines = [
+        f"{'method':<6} {'endpoint':<52} {'count':>6} {'errors':>6}"
+        f" {'retries':>7} {'mean':>7} {'p95':>7} {'max':>7}"
+    ]
+    for method, endpoint in endpoints:
+        histogram = REQUEST_DURATION.values[(method, endpoint)]
+        errors = sum(
+            count
+            for (m, e, status), count in statuses.items()
+            if m == method and e == endpoint and not status.startswith("2")
+        )
+        p95 = REQUEST_DURATION.quantile(0.95, method=method, endpoint=endpoint)
+        lines.append(
+            f"{method:<6} {endpoint:<52} {histogram.count:>6}"
+            f" {int(errors):>6} {int(retries.get((method, endpoint), 0)):>7}"
+            f" {histogram.sum / histogram.count:>7.3f}"
+            f" {p95 or 0.0:>7.3f} {histogram.max:>7.3f}"
+        )
+    if len(phases) > 0:
+        lines.append("")
+        lines.append(
+            f"{'interface':<20} {'phase':<8} {'seconds':>9} {'retries':>7}"
+        )
+        for (interface, phase), seconds in phases:
+            phase_retries = sum(
+                count
+                for (i, _), count in toggle_retries.items()
+                if i == interface and phase == "toggle"
+            )
+            lines.append(
+                f"{interface:<20} {phase:<8} {seconds:>9.2f}"
+                f" {int(phase_retries):>7}"
+            )
+    return "\n".join(lines)
+
+
+class MetricsExporter:
+    """Exposes metrics while a command runs.
+
+    Serves them on `port` at '/metrics', and rewrites `textfile` every
+    `interval_s` seconds. The summary table is printed on exit.
+    """
+
+    def __init__(
+        self,
+        port: Optional[int] = None,
+        textfile: Optional[str] = None,
+        interval_s: float = DEFAULT_EXPORT_INTERVAL_S,
+    ):
+        self.port = port
+        self.textfile = textfile
+        self.interval_s = interval_s
+        self.__server: Optional[ThreadingHTTPServer] = None
+        self.__stopped = threading.Event()
+        self.__threads: List[threading.Thread] = []
+
+    def __enter__(self) -> "MetricsExporter":
+        if self.port is not None:
+            self.__server = ThreadingHTTPServer(
+                ("127.0.0.1", self.port), _MetricsHandler
+            )
+            self.__start(self.__server.serve_forever)
+            logger.info(
+                f"Serving metrics at http://127.0.0.1:{self.port}/metrics"
+            )
+        if self.textfile is not None:
+            self.__start(self.__write_periodically)
+        return self
+
+    def __exit__(self, *exc):
+        self.__stopped.set()
+        if self.__server is not None:
+            self.__server.shutdown()
+            self.__server.server_close()
+        for thread in self.__threads:
+            thread.join()
+        if self.textfile is not None:
+            write_textfile(self.textfile)
+        if len(REQUEST_DURATION.values) > 0:
+            logger.info(f"API request summary:\n{summary()}")
+
+    def __start(self, target):
+        thread = threading.Thread(target=target, daemon=True)
+        thread.start()
+        self.__threads.append(thread)
+
+    def __write_periodically(self):
+        while not self.__stopped.wait(self.interval_s):
+            try:
+                write_textfile(self.textfile)
+            except OSError as e:
+                logger.warning(f"Unable to write metrics: {e}")
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
@@ -0,0 +1,158 @@
+import cProfile
+import heapq
+import io
+import itertools
+import json
+import logging
+import pstats
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Functions listed in the log once profiling has finished
+PROFILE_SUMMARY_LINES = 25
+
+__timeline: Optional["Timeline"] = None
+
+
+def active_timeline() -> Optional["Timeline"]:
+    """The timeline being recorded by `profile`, if any."""
+    return __timeline
+
+
+def describe(coro) -> str:
+    """Name a coroutine by its module and qualified name."""
+    name = getattr(coro, "__qualname__", type(coro).__name__)
+    frame = getattr(coro, "cr_frame", None)
+    if frame is None:
+        return name
+    module = frame.f_globals.get("__name__", "")
+    return f"{module.rsplit('.', 1)[-1]}.{name}"
+
+
+class Track:
+    """A named group of lanes in the timeline.
+
+    Each task occupies the lowest free lane from when it is created until
+    it is done, so that its spans do not overlap with any other task's.
+    """
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.__free: List[int] = []
+        self.__lanes = itertools.count()
+
+    def acquire_lane(self) -> int:
+        if len(self.__free) > 0:
+            return heapq.heappop(self.__free)
+        return next(self.__lanes)
+
+    def release_lane(self, lane: int):
+        heapq.heappush(self.__free, lane)
+
+
+class TracedTask:
+    def __init__(self):
+        self.created = time.perf_counter()
+        self.started: Optional[float] = None
+
+    def start(self):
+        """Mark the end of waiting and the start of running."""
+        self.started = time.perf_counter()
+
+
+class Timeline:
+    """Records when tasks wait and run, as a Chrome trace.
+
+    Load the output in chrome://tracing or https://ui.perfetto.dev.
+    """
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.events: List[dict] = []
+        self.__tracks: Dict[str, Track] = {}
+        self.__pids = itertools.count(1)
+
+    def track(self, name: str) -> Track:
+        if name not in self.__tracks:
+            pid = next(self.__pids)
+            self.__tracks[name] = Track(pid)
+            self.events.append(
+                {
+                    "name": "process_name",
+                    "ph": "M",
+                    "pid": pid,
+                    "tid": 0,
+                    "args": {"name": name},
+                }
+            )
+        return self.__tracks[name]
+
+    def span(self, name: str, category: str, pid: int, tid: int, start, end):
+        self.events.append(
+            {
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": (start - self.origin) * 1e6,
+                "dur": (end - start) * 1e6,
+                "pid": pid,
+                "tid": tid,
+            }
+        )
+
+    @contextmanager
+    def task(
+        self, track_name: str, name: str, wait: str
+    ) -> Iterator[TracedTask]:
+        """Trace a task which waits on `wait` until `TracedTask.start`
+        is called, then runs until the block exits.
+        """
+        track = self.track(track_name)
+        lane = track.acquire_lane()
+        task = TracedTask()
+        try:
+            yield task
+        finally:
+            end = time.perf_counter()
+            started = task.started if task.started is not None else end
+            self.span(wait, "wait", track.pid, lane, task.created, started)
+            if task.started is not None:
+                self.span(name, "run", track.pid, lane, started, end)
+            track.release_lane(lane)
+
+    def write(self, path: str):
+        with open(path, "w") as f:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, f)
+
+
+@contextmanager
+def profile(prefix: str) -> Iterator[None]:
+    """Profile the block with cProfile and record a timeline of tasks.
+
+    Writes '<prefix>.prof', which can be read with `pstats` or snakeviz, and
+    '<prefix>.trace.json'.
+    """
+    global __timeline
+    __timeline = Timeline()
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        timeline, __timeline = __timeline, None
+        profiler.dump_stats(f"{prefix}.prof")
+        timeline.write(f"{prefix}.trace.json")
+
+        stats = io.StringIO()
+        pstats.Stats(profiler, stream=stats).sort_stats(
+            "cumulative"
+        ).print_stats(PROFILE_SUMMARY_LINES)
+        logger.info(stats.getvalue())
+        logger.info(
+            f"Wrote profile to '{prefix}.prof' and timeline to"
+            f" '{prefix}.trace.json'."
+        )
@@ -0,0 +1,191 @@
+import datetime
+import logging
+import shutil
+import sys
+import time
+from typing import Dict, Optional, TextIO, Tuple
+
+from domino_maintenance_mode.metrics import REQUESTS
+
+logger = logging.getLogger(__name__)
+
+# Minimum time between redraws of the progress line on a terminal
+DEFAULT_REDRAW_INTERVAL_S = 0.2
+# Time between progress log lines when not writing to a terminal
+DEFAULT_LOG_INTERVAL_S = 10.0
+# Weight of the latest interval in the smoothed request rate
+RATE_SMOOTHING = 0.3
+
+_active: Optional["ProgressReporter"] = None
+
+
+class ProgressCounter:
+    """Counts work done, out of `total` if it is known.
+
+    Only counters of work done at a steady rate, with `eta` set, are used to
+    estimate when all work will be done.
+    """
+
+    def __init__(self, reporter: Optional["ProgressReporter"], eta: bool):
+        self.reporter = reporter
+        self.eta = eta
+        self.done = 0
+        self.total: Optional[int] = None
+        self.started = time.monotonic()
+
+    def add_total(self, n: int):
+        self.total = (self.total or 0) + n
+        self.__refresh()
+
+    def update(self, n: int = 1):
+        self.done += n
+        self.__refresh()
+
+    def __refresh(self):
+        if self.reporter is not None:
+            self.reporter.refresh()
+
+    def eta_s(self, now: float) -> Optional[float]:
+        """Seconds until `total` is reached at the rate so far."""
+        if (
+            not self.eta
+            or self.total is None
+            or self.done >= self.total
+            or self.done == 0
+        ):
+            return None
+        rate = self.done / max(now - self.started, 1e-9)
+        return (self.total - self.done) / rate
+
+
+def counter(
+    interface: str, phase: str, total: Optional[int] = None, eta: bool = True
+) -> ProgressCounter:
+    """The progress counter for `phase` of `interface`, shared by every
+    caller, reported by the active `ProgressReporter` if there is one.
+    """
+    if _active is not None:
+        progress = _active.counter(interface, phase, eta)
+    else:
+        progress = ProgressCounter(None, eta)
+    if total is not None:
+        progress.add_total(total)
+    return progress
+
+
+class _ClearLine(logging.Filter):
+    def __init__(self, reporter: "ProgressReporter"):
+        super().__init__()
+        self.reporter = reporter
+
+    def filter(self, record) -> bool:
+        self.reporter.clear()
+        return True
+
+
+class ProgressReporter:
+    """Reports every progress counter on one line.
+
+    On a terminal the line is redrawn in place at most every
+    `redraw_interval_s` seconds, and cleared before anything is logged.
+    Otherwise it is logged every `log_interval_s` seconds.
+    """
+
+    def __init__(
+        self,
+        stream: TextIO = sys.stderr,
+        redraw_interval_s: float = DEFAULT_REDRAW_INTERVAL_S,
+        log_interval_s: float = DEFAULT_LOG_INTERVAL_S,
+    ):
+        self.stream = stream
+        self.tty = stream.isatty()
+        self.interval_s = redraw_interval_s if self.tty else log_interval_s
+        self.__counters: Dict[Tuple[str, str], ProgressCounter] = {}
+        self.__drawn = False
+        self.__last_refresh = time.monotonic()
+        self.__last_requests = 0.0
+        self.__rate: Optional[float] = None
+        self.__filter = _ClearLine(self)
+
+    def __enter__(self) -> "ProgressReporter":
+        global _active
+        _active = self
+        self.__last_requests = REQUESTS.total()
+        if self.tty:
+            for handler in logging.getLogger().handlers:
+                handler.addFilter(self.__filter)
+        return self
+
+    def __exit__(self, *exc):
+        global _active
+        _active = None
+        if self.tty:
+            for handler in logging.getLogger().handlers:
+                handler.removeFilter(self.__filter)
+        if len(self.__counters) > 0:
+            self.refresh(force=True)
+            if self.tty:
+                self.stream.write("\n")
+                self.stream.flush()
+
+    def counter(
+        self, interface: str, phase: str, eta: bool
+    ) -> ProgressCounter:
+        key = (interface, phase)
+        if key not in self.__counters:
+            self.__counters[key] = ProgressCounter(self, eta)
+        return self.__counters[key]
+
+    def clear(self):
+        """Remove the progress line from the terminal, until the next
+        redraw.
+        """
+        if self.__drawn:
+            self.stream.write("\r\x1b[K")
+            self.__drawn = False
+
+    def refresh(self, force: bool = False):
+        now = time.monotonic()
+        elapsed = now - self.__last_refresh
+        if not force and elapsed < self.interval_s:
+            return
+        requests = REQUESTS.total()
+        if elapsed > 0:
+            rate = (requests - self.__last_requests) / elapsed
+            self.__rate = (
+                rate
+                if self.__rate is None
+                else RATE_SMOOTHING * rate + (1 - RATE_SMOOTHING) * self.__rate
+            )
+        self.__last_refresh = now
+        self.__last_requests = requests
+
+        line = self.render(now)
+        if self.tty:
+            width = shutil.get_terminal_size().columns
+            self.stream.write(f"\r{line[: width - 1]}\x1b[K")
+            self.stream.flush()
+            self.__drawn = True
+        else:
+            logger.info(line)
+
+    def render(self, now: float) -> str:
+        parts = []
+        etas = []
+        for (interface, phase), progress in self.__counters.items():
+            if progress.total == 0:
+                continue
+            if progress.total is None:
+                parts.append(f"{interface} {phase} {progress.done}")
+            else:
+                parts.append(
+                    f"{interface} {phase} {progress.done}/{progress.total}"
+                )
+            eta = progress.eta_s(now)
+            if eta is not None:
+                etas.append(eta)
+        if self.__rate is not None:
+            parts.append(f"{self.__rate:.1f} req/s")
+        if len(etas) > 0:
+            parts.append(f"ETA {datetime.timedelta(seconds=round(max(etas)))}")
+        return " | ".join(parts)
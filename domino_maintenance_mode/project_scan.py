@@ -0,0 +1,71 @@
+import asyncio
+import logging
+from contextlib import aclosing
+from typing import AsyncGenerator, Dict, List, Tuple
+
+from domino_maintenance_mode import progress
+from domino_maintenance_mode.execution_interface import (
+    Execution,
+    ExecutionInterface,
+)
+from domino_maintenance_mode.projects import Project
+from domino_maintenance_mode.transport import Transport
+from domino_maintenance_mode.util import map_with_concurrency
+
+logger = logging.getLogger(__name__)
+
+
+async def iter_projects(
+    transport: Transport,
+    projects: List[Project],
+    interfaces: List[ExecutionInterface],
+    concurrency: int,
+) -> AsyncGenerator[Tuple[ExecutionInterface, List[Execution]], None]:
+    """List running executions of `interfaces` which are scanned by project.
+
+    Each project is visited once, with the requests of every interface for
+    it sent together, and up to `concurrency` projects are visited at once.
+    Yields the executions of each interface in a project as soon as the
+    project has been scanned.
+    """
+    logger.info(
+        "Scanning "
+        + " and ".join(f"{i.singular()}s" for i in interfaces)
+        + " by Project"
+    )
+    scanned = progress.counter("Project", "scan", total=len(projects))
+
+    async def scan(project: Project) -> List[List[Execution]]:
+        return await asyncio.gather(
+            *[
+                interface.list_running_in_project(transport, project)
+                for interface in interfaces
+            ]
+        )
+
+    async with aclosing(
+        map_with_concurrency(concurrency, scan, projects)
+    ) as results:
+        async for executions in results:
+            scanned.update()
+            for interface, found in zip(interfaces, executions):
+                if len(found) > 0:
+                    yield interface, found
+
+
+async def scan_projects(
+    transport: Transport,
+    projects: List[Project],
+    interfaces: List[ExecutionInterface],
+    concurrency: int,
+) -> Dict[str, List[Execution]]:
+    """Collect the executions from `iter_projects` by interface."""
+    executions: Dict[str, List[Execution]] = {
+        interface.singular(): [] for interface in interfaces
+    }
+    async with aclosing(
+        iter_projects(transport, projects, interfaces, concurrency)
+    ) as results:
+        async for interface, found in results:
+            executions[interface.singular()].extend(found)
+    return executions
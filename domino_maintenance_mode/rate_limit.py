@@ -0,0 +1,177 @@
+import asyncio
+import collections
+import logging
+import time
+from email.utils import parsedate_to_datetime
+from typing import Deque, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONCURRENCY = 20
+
+# AIMD tuning
+DECREASE_FACTOR = 0.7
+# Latency above this multiple of the baseline is treated as congestion
+LATENCY_TOLERANCE = 2.0
+# Smoothing for the short and long term latency averages
+FAST_ALPHA = 0.2
+SLOW_ALPHA = 0.02
+# Fallback pause for 429 / 503 responses without a 'Retry-After' header
+DEFAULT_RETRY_AFTER_S = 1.0
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a 'Retry-After' header, either delay seconds or an HTTP date."""
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveRateLimiter:
+    """Bounds API requests by rate and by adaptive concurrency.
+
+    Requests per second are capped by a token bucket when `max_rps` is set.
+    The number of requests in flight is adjusted between `min_concurrency`
+    and `max_concurrency` using additive increase / multiplicative decrease:
+    it grows while requests succeed at normal latency, and shrinks when
+    latency rises well above its long term average or the API responds with
+    429 or 5xx. A 'Retry-After' header pauses all requests.
+    """
+
+    def __init__(
+        self,
+        max_rps: Optional[float] = None,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        min_concurrency: int = 1,
+    ):
+        self.max_rps = max_rps
+        self.max_concurrency = max(max_concurrency, 1)
+        self.min_concurrency = min(max(min_concurrency, 1), max_concurrency)
+        self.limit = float(self.max_concurrency)
+        self.in_flight = 0
+        self.__waiters: Deque[asyncio.Future] = collections.deque()
+        self.__tokens = max(max_rps or 0, 1.0)
+        self.__last_refill = time.monotonic()
+        self.__paused_until = 0.0
+        self.__last_decrease = 0.0
+        self.__fast_latency: Optional[float] = None
+        self.__slow_latency: Optional[float] = None
+
+    async def acquire(self):
+        """Wait for a free slot and a token. Must be paired with `release`."""
+        while self.in_flight >= int(self.limit):
+            waiter = asyncio.get_running_loop().create_future()
+            self.__waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                self.__wake()
+                raise
+        self.in_flight += 1
+        try:
+            await self.__take_token()
+        except asyncio.CancelledError:
+            self.in_flight -= 1
+            self.__wake()
+            raise
+
+    def release(
+        self,
+        latency_s: float,
+        status: Optional[int] = None,
+        retry_after_s: Optional[float] = None,
+    ):
+        """Record the outcome of a request.
+
+        `status` is `None` if no response was received.
+        """
+        self.in_flight -= 1
+        throttled = status == 429 or status == 503
+        if throttled or status is None or status >= 500:
+            if throttled:
+                self.pause(
+                    retry_after_s
+                    if retry_after_s is not None
+                    else DEFAULT_RETRY_AFTER_S
+                )
+            self.__decrease()
+        else:
+            self.__record_latency(latency_s)
+        self.__wake()
+
+    def cancel(self):
+        """Free the slot of a request which was cancelled by its caller.
+
+        A cancellation says nothing about the API, so the limit is unchanged.
+        """
+        self.in_flight -= 1
+        self.__wake()
+
+    def pause(self, seconds: float):
+        """Stop issuing requests for `seconds`."""
+        paused_until = time.monotonic() + seconds
+        if paused_until > self.__paused_until:
+            logger.warning(f"API requested backoff, pausing for {seconds}s.")
+            self.__paused_until = paused_until
+
+    async def __take_token(self):
+        while True:
+            now = time.monotonic()
+            if now < self.__paused_until:
+                await asyncio.sleep(self.__paused_until - now)
+                continue
+            if self.max_rps is None:
+                return
+            self.__tokens = min(
+                self.__tokens + (now - self.__last_refill) * self.max_rps,
+                max(self.max_rps, 1.0),
+            )
+            self.__last_refill = now
+            if self.__tokens >= 1:
+                self.__tokens -= 1
+                return
+            await asyncio.sleep((1 - self.__tokens) / self.max_rps)
+
+    def __record_latency(self, latency_s: float):
+        if self.__fast_latency is None or self.__slow_latency is None:
+            self.__fast_latency = self.__slow_latency = latency_s
+        else:
+            self.__fast_latency += FAST_ALPHA * (
+                latency_s - self.__fast_latency
+            )
+            self.__slow_latency += SLOW_ALPHA * (
+                latency_s - self.__slow_latency
+            )
+        if self.__fast_latency > LATENCY_TOLERANCE * self.__slow_latency:
+            self.__decrease()
+        else:
+            self.limit = min(
+                self.limit + 1 / self.limit, float(self.max_concurrency)
+            )
+
+    def __decrease(self):
+        # At most once per round trip, so one burst of errors from requests
+        # which were already in flight only counts once.
+        now = time.monotonic()
+        if now - self.__last_decrease < (self.__fast_latency or 0):
+            return
+        self.__last_decrease = now
+        self.limit = max(
+            self.limit * DECREASE_FACTOR, float(self.min_concurrency)
+        )
+        logger.debug(f"Reduced API concurrency to {int(self.limit)}.")
+
+    def __wake(self):
+        free = int(self.limit) - self.in_flight
+        while free > 0 and len(self.__waiters) > 0:
+            waiter = self.__waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
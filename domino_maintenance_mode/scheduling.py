@@ -0,0 +1,43 @@
+import heapq
+import itertools
+import time
+from typing import Generic, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class DelayQueue(Generic[T]):
+    """Priority queue of items which become available after a delay.
+
+    Items are ordered by the monotonic time at which they are due, ties are
+    broken in insertion order.
+    """
+
+    def __init__(self) -> None:
+        self.__heap: List[Tuple[float, int, T]] = []
+        self.__counter = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self.__heap)
+
+    def push(self, item: T, delay: float = 0.0):
+        due = time.monotonic() + max(delay, 0.0)
+        heapq.heappush(self.__heap, (due, next(self.__counter), item))
+
+    def time_until_due(self) -> Optional[float]:
+        """Seconds until the next item is due, `None` if the queue is empty."""
+        if len(self.__heap) == 0:
+            return None
+        return max(self.__heap[0][0] - time.monotonic(), 0.0)
+
+    def pop_due(self) -> Optional[T]:
+        """Pop the next item if it is due, otherwise return `None`."""
+        if len(self.__heap) == 0 or self.__heap[0][0] > time.monotonic():
+            return None
+        return heapq.heappop(self.__heap)[2]
+
+    def drain(self) -> List[T]:
+        """Remove and return all items regardless of when they are due."""
+        items = [item for _, _, item in sorted(self.__heap)]
+        self.__heap = []
+        return items
@@ -0,0 +1,114 @@
+import logging
+from dataclasses import dataclass
+from fnmatch import fnmatchcase
+from typing import Iterable, List, Optional, Set, Tuple
+
+from domino_maintenance_mode.execution_interface import (
+    Execution,
+    ExecutionInterface,
+)
+from domino_maintenance_mode.projects import Project
+
+logger = logging.getLogger(__name__)
+
+
+def _matches(patterns: Iterable[str], *values: str) -> bool:
+    return any(
+        fnmatchcase(value, pattern) for pattern in patterns for value in values
+    )
+
+
+def _allowed(
+    include: Tuple[str, ...], exclude: Tuple[str, ...], *values: str
+) -> bool:
+    if len(include) > 0 and not _matches(include, *values):
+        return False
+    return not _matches(exclude, *values)
+
+
+@dataclass
+class Scope:
+    """Limits a scan to part of the deployment.
+
+    Each pattern is a glob (see `fnmatch`). When any `include` patterns are
+    given, only matching values are in scope, and values matching `exclude`
+    patterns are then removed. Projects match on their id or name, owners
+    are the usernames of project owners.
+    """
+
+    projects: Tuple[str, ...] = ()
+    exclude_projects: Tuple[str, ...] = ()
+    owners: Tuple[str, ...] = ()
+    exclude_owners: Tuple[str, ...] = ()
+    hardware_tiers: Tuple[str, ...] = ()
+    exclude_hardware_tiers: Tuple[str, ...] = ()
+
+    def filters_projects(self) -> bool:
+        return any(
+            [
+                self.projects,
+                self.exclude_projects,
+                self.owners,
+                self.exclude_owners,
+            ]
+        )
+
+    def includes_project(self, project: Project) -> bool:
+        return _allowed(
+            self.projects, self.exclude_projects, project._id, project.name
+        ) and _allowed(self.owners, self.exclude_owners, project.owner)
+
+    def includes_hardware_tier(self, hardware_tier: Optional[str]) -> bool:
+        # Executions which do not record a hardware tier are not filtered
+        if hardware_tier is None:
+            return True
+        return _allowed(
+            self.hardware_tiers, self.exclude_hardware_tiers, hardware_tier
+        )
+
+    def filter_projects(self, projects: List[Project]) -> List[Project]:
+        scoped = [p for p in projects if self.includes_project(p)]
+        if len(scoped) < len(projects):
+            logger.info(
+                f"Scoped scan to {len(scoped)}/{len(projects)} projects."
+            )
+        return scoped
+
+    def filter_executions(
+        self,
+        interface: ExecutionInterface,
+        executions: List[Execution],
+        known_project_ids: Set[str],
+        scoped_project_ids: Set[str],
+    ) -> List[Execution]:
+        """Remove executions of projects out of scope, for interfaces which
+        scan the whole deployment rather than by project, and those on
+        hardware tiers out of scope.
+
+        Executions of projects which are not known are kept unless projects
+        are filtered, as they cannot be shown to be out of scope.
+        """
+        singular = interface.singular()
+
+        def includes(execution: Execution) -> bool:
+            project_id = getattr(execution._id, "projectId", None)
+            if project_id is not None and project_id not in known_project_ids:
+                if self.filters_projects():
+                    logger.warning(
+                        f"Leaving out {singular} '{execution.name}' of"
+                        f" unknown project '{project_id}'."
+                    )
+                    return False
+                logger.warning(
+                    f"{singular} '{execution.name}' is in unknown project"
+                    f" '{project_id}'."
+                )
+            elif (
+                project_id is not None and project_id not in scoped_project_ids
+            ):
+                return False
+            return self.includes_hardware_tier(
+                interface.hardware_tier(execution._id)
+            )
+
+        return list(filter(includes, executions))
@@ -0,0 +1,39 @@
+import hashlib
+import re
+from typing import Optional, Tuple
+
+import click
+
+# (index, count), where the index is from 1 to count
+Shard = Tuple[int, int]
+
+
+def shard_label(shard: Shard) -> str:
+    return f"shard-{shard[0]}-of-{shard[1]}"
+
+
+def in_shard(key: str, shard: Optional[Shard]) -> bool:
+    """Deterministically assign `key` to one of `shard[1]` shards."""
+    if shard is None:
+        return True
+    digest = hashlib.sha256(key.encode()).digest()
+    return int.from_bytes(digest[:8], "big") % shard[1] == shard[0] - 1
+
+
+class ShardParamType(click.ParamType):
+    """Parses 'i/N', the i-th of N shards."""
+
+    name = "i/N"
+
+    def convert(self, value, param, ctx) -> Shard:
+        if isinstance(value, tuple):
+            return value
+        match = re.fullmatch(r"(\d+)/(\d+)", value.strip())
+        if match is None:
+            self.fail(f"'{value}' is not of the form 'i/N'.", param, ctx)
+        index, count = int(match.group(1)), int(match.group(2))
+        if not 1 <= index <= count:
+            self.fail(
+                f"Shard {index} must be between 1 and {count}.", param, ctx
+            )
+        return index, count
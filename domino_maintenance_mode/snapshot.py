@@ -0,0 +1,107 @@
+import datetime
+import gzip
+import json
+import logging
+from collections import Counter
+from dataclasses import asdict
+from typing import Iterable, Iterator, List, Tuple
+
+from domino_maintenance_mode.execution_interface import (
+    Execution,
+    ExecutionInterface,
+)
+
+logger = logging.getLogger(__name__)
+
+# Version 1 is a single JSON object of executions by type
+SNAPSHOT_VERSION = 2
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+class SnapshotWriter:
+    """Writes a snapshot as gzip compressed NDJSON.
+
+    The first line is a header with the format version, followed by one line
+    per execution tagged with its type. A trailer with the number of
+    executions of each type is written on successful exit, marking the
+    snapshot as complete.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.counts: Counter = Counter()
+        self.__file = gzip.open(path, "xt", encoding="utf-8")
+        self.__write_line(
+            {
+                "version": SNAPSHOT_VERSION,
+                "created": datetime.datetime.now().isoformat(),
+            }
+        )
+
+    def __enter__(self) -> "SnapshotWriter":
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.__write_line({"counts": dict(self.counts)})
+        self.__file.close()
+
+    def __write_line(self, data: dict):
+        self.__file.write(json.dumps(data) + "\n")
+
+    def write(self, singular: str, executions: Iterable[Execution]):
+        for execution in executions:
+            self.__write_line(
+                {"type": singular, "execution": asdict(execution)}
+            )
+            self.counts[singular] += 1
+
+
+class Snapshot:
+    """Reads a snapshot written by `SnapshotWriter`, or by older versions.
+
+    Executions are read from disk each time they are requested rather than
+    held in memory.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self.version = 2 if f.read(2) == GZIP_MAGIC else 1
+
+    def __iter__(self) -> Iterator[Tuple[str, dict]]:
+        """(type, execution) for every execution in the snapshot."""
+        if self.version == 1:
+            with open(self.path) as f:
+                for singular, executions in json.load(f).items():
+                    for execution in executions:
+                        yield singular, execution
+            return
+
+        complete = False
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            header = json.loads(f.readline())
+            if header.get("version", 0) > SNAPSHOT_VERSION:
+                raise Exception(
+                    f"Snapshot '{self.path}' is version {header['version']},"
+                    " please upgrade dmm to read it."
+                )
+            for line in f:
+                data = json.loads(line)
+                if "counts" in data:
+                    complete = True
+                    break
+                yield data["type"], data["execution"]
+        if not complete:
+            raise Exception(
+                f"Snapshot '{self.path}' is incomplete, the scan which wrote"
+                " it did not finish. Please take a new snapshot."
+            )
+
+    def executions(self, interface: ExecutionInterface) -> List[Execution]:
+        singular = interface.singular()
+        return [
+            interface.execution_from_dict(execution)
+            for t, execution in self
+            if t == singular
+        ]
@@ -0,0 +1,207 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional
+
+import aiohttp
+import backoff
+
+from domino_maintenance_mode.metrics import (
+    REQUEST_DURATION,
+    REQUEST_RETRIES,
+    REQUESTS,
+    endpoint_template,
+)
+from domino_maintenance_mode.profiling import active_timeline
+from domino_maintenance_mode.rate_limit import (
+    AdaptiveRateLimiter,
+    parse_retry_after,
+)
+from domino_maintenance_mode.util import (
+    get_api_key,
+    get_hostname,
+    should_verify,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONNECTION_LIMIT = 100
+DEFAULT_KEEPALIVE_TIMEOUT_S = 60
+DEFAULT_DNS_CACHE_TTL_S = 300
+
+
+def _count_retry(details):
+    # `details["args"]` are the arguments of `Transport.get`
+    REQUEST_RETRIES.inc(
+        method="GET", endpoint=endpoint_template(details["args"][1])
+    )
+
+
+class Transport:
+    """The pooled HTTP client used for all calls to the Domino API.
+
+    Connections are kept alive and reused between requests, DNS lookups are
+    cached and responses are gzip compressed. Every request is paced by the
+    shared rate limiter, and its latency and status are recorded in
+    `metrics`.
+
+    Use as an async context manager; the underlying client is opened on
+    entry and closed on exit, and may be re-opened in another event loop.
+    """
+
+    def __init__(
+        self,
+        rate_limiter: Optional[AdaptiveRateLimiter] = None,
+        connection_limit: int = DEFAULT_CONNECTION_LIMIT,
+        keepalive_timeout_s: float = DEFAULT_KEEPALIVE_TIMEOUT_S,
+        dns_cache_ttl_s: int = DEFAULT_DNS_CACHE_TTL_S,
+    ):
+        self.hostname = get_hostname()
+        self.api_key = get_api_key()
+        self.rate_limiter = rate_limiter or AdaptiveRateLimiter()
+        self.connection_limit = connection_limit
+        self.keepalive_timeout_s = keepalive_timeout_s
+        self.dns_cache_ttl_s = dns_cache_ttl_s
+        self.__session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self) -> "Transport":
+        if self.__session is None:
+            # TODO: Ability to trust custom certs?
+            ssl: Dict[str, Any] = {} if should_verify() else {"ssl": False}
+            connector = aiohttp.TCPConnector(
+                limit=self.connection_limit,
+                keepalive_timeout=self.keepalive_timeout_s,
+                use_dns_cache=True,
+                ttl_dns_cache=self.dns_cache_ttl_s,
+                **ssl,
+            )
+            self.__session = aiohttp.ClientSession(
+                connector=connector,
+                headers={
+                    "Content-Type": "application/json",
+                    "Accept-Encoding": "gzip, deflate",
+                    "X-Domino-Api-Key": self.api_key,
+                },
+            )
+        return self
+
+    async def __aexit__(self, *exc):
+        if self.__session is not None:
+            await self.__session.close()
+            self.__session = None
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        json: Optional[dict] = None,
+        success_code: int = 200,
+    ) -> Any:
+        if self.__session is None:
+            raise Exception("Transport must be opened before use.")
+        timeline = active_timeline()
+        if timeline is None:
+            return await self.__request(method, path, json, success_code)
+        with timeline.task(
+            "API requests",
+            f"{method} {endpoint_template(path)}",
+            "rate limit",
+        ) as task:
+            return await self.__request(
+                method, path, json, success_code, task.start
+            )
+
+    async def __request(
+        self,
+        method: str,
+        path: str,
+        json: Optional[dict],
+        success_code: int,
+        on_acquire=None,
+    ) -> Any:
+        assert self.__session is not None
+        url = f"{self.hostname}{path}"
+
+        await self.rate_limiter.acquire()
+        if on_acquire is not None:
+            on_acquire()
+        status = None
+        retry_after_s = None
+        cancelled = False
+        tic = time.monotonic()
+        try:
+            async with self.__session.request(
+                method, url=url, json=json
+            ) as response:
+                status = response.status
+                retry_after_s = parse_retry_after(
+                    response.headers.get("Retry-After")
+                )
+                if response.status != success_code:
+                    resp = await response.text()
+                    raise Exception(
+                        f"API ({url})"
+                        f"returned error ({response.status}): {resp}"
+                    )
+                return await response.json(content_type=None)
+        except asyncio.CancelledError:
+            # Prefetched pages and polls are cancelled when no longer needed
+            cancelled = True
+            raise
+        finally:
+            if cancelled:
+                self.rate_limiter.cancel()
+            else:
+                self.__record(
+                    method,
+                    path,
+                    time.monotonic() - tic,
+                    status,
+                    retry_after_s,
+                )
+
+    def __record(
+        self,
+        method: str,
+        path: str,
+        latency_s: float,
+        status: Optional[int],
+        retry_after_s: Optional[float],
+    ):
+        self.rate_limiter.release(latency_s, status, retry_after_s)
+        endpoint = endpoint_template(path)
+        REQUEST_DURATION.observe(latency_s, method=method, endpoint=endpoint)
+        REQUESTS.inc(
+            method=method,
+            endpoint=endpoint,
+            status="error" if status is None else str(status),
+        )
+
+    @backoff.on_exception(
+        backoff.expo,
+        Exception,
+        max_tries=3,
+        jitter=backoff.random_jitter,
+        factor=0.5,
+        on_backoff=_count_retry,
+    )
+    async def get(self, path: str, success_code: int = 200) -> Any:
+        try:
+            return await self.request("GET", path, success_code=success_code)
+        except Exception as e:
+            print(f"Unable to get url {path} due to {e}.")
+            raise e
+
+    async def post(
+        self, path: str, json: Optional[dict] = None, success_code: int = 200
+    ) -> Any:
+        return await self.request(
+            "POST", path, json=json, success_code=success_code
+        )
+
+    async def put(
+        self, path: str, json: Optional[dict] = None, success_code: int = 200
+    ) -> Any:
+        return await self.request(
+            "PUT", path, json=json, success_code=success_code
+        )
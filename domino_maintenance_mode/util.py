@@ -1,5 +1,19 @@
 import asyncio
+import itertools
 import os
+from typing import (
+    AsyncGenerator,
+    Awaitable,
+    Callable,
+    Iterable,
+    Set,
+    TypeVar,
+)
+
+from domino_maintenance_mode.profiling import active_timeline, describe
+
+T = TypeVar("T")
+R = TypeVar("R")
 
 
 def get_api_key() -> str:
@@ -30,9 +44,63 @@ def should_verify() -> bool:
 
 async def gather_with_concurrency(n, *coros):
     semaphore = asyncio.Semaphore(n)
+    timeline = active_timeline()
 
     async def sem_coro(coro):
         async with semaphore:
             return await coro
 
+    async def traced_coro(coro):
+        name = describe(coro)
+        with timeline.task(name, name, "semaphore") as task:
+            async with semaphore:
+                task.start()
+                return await coro
+
+    if timeline is not None:
+        return await asyncio.gather(*(traced_coro(c) for c in coros))
     return await asyncio.gather(*(sem_coro(c) for c in coros))
+
+
+async def map_with_concurrency(
+    n: int, func: Callable[[T], Awaitable[R]], items: Iterable[T]
+) -> AsyncGenerator[R, None]:
+    """Call `func` on each of `items` with up to `n` calls in flight,
+    yielding results as they complete rather than in order.
+
+    Items are only taken from `items` as earlier calls finish, so no more
+    than `n` coroutines exist at once however many items there are. If a
+    call raises, the calls still in flight are cancelled.
+    """
+    timeline = active_timeline()
+    remaining = iter(items)
+    in_flight: Set[asyncio.Future] = set()
+
+    async def traced_coro(coro):
+        name = describe(coro)
+        with timeline.task(name, name, "semaphore") as task:
+            task.start()
+            return await coro
+
+    def start(item: T) -> asyncio.Future:
+        coro = func(item)
+        if timeline is not None:
+            return asyncio.ensure_future(traced_coro(coro))
+        return asyncio.ensure_future(coro)
+
+    try:
+        in_flight.update(map(start, itertools.islice(remaining, max(n, 1))))
+        while len(in_flight) > 0:
+            done, in_flight = await asyncio.wait(
+                in_flight, return_when=asyncio.FIRST_COMPLETED
+            )
+            # Refilled before yielding, so calls continue while the
+            # results are consumed
+            in_flight.update(
+                map(start, itertools.islice(remaining, len(done)))
+            )
+            for task in done:
+                yield task.result()
+    finally:
+        for task in in_flight:
+            task.cancel()
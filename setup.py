@@ -10,14 +10,11 @@ setuptools.setup(
         " upgrades and restore afterwards."
     ),
     url="https://github.com/dominodatalab/domino-maintenance-mode",
-    packages=setuptools.find_packages(),
+    packages=setuptools.find_packages(exclude=["benchmarks"]),
     install_requires=[
         "click",
-        "requests",
-        "tqdm",
         "asyncio",
         "aiohttp",
-        "types-requests",
         "backoff",
     ],
     entry_points={